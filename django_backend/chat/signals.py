@@ -0,0 +1,10 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from store import images
+from .models import Message
+
+
+@receiver(post_save, sender=Message)
+def generate_image_derivatives(sender, instance, update_fields=None, **kwargs):
+    """Queue resized copies of images shared in chat"""
+    images.schedule_fields(instance, ('image',), update_fields)
@@ -15,11 +15,13 @@ def conversation_list(request):
     conversations = Conversation.objects.filter(
         Q(buyer=request.user) | Q(seller=request.user),
         is_active=True
-    ).select_related('buyer', 'seller', 'shop', 'product').prefetch_related('messages')
-    
-    # Add unread count to each conversation
-    for conv in conversations:
-        conv.unread = conv.unread_count(request.user)
+    ).select_related('buyer', 'seller', 'shop', 'product').prefetch_related('messages').annotate(
+        # Same as Conversation.unread_count, counted in the list query itself
+        unread=Count(
+            'messages',
+            filter=Q(messages__is_read=False) & ~Q(messages__sender=request.user),
+        )
+    )
     
     context = {
         'conversations': conversations,
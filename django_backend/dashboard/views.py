@@ -36,7 +36,7 @@ def seller_dashboard_view(request):
         wallet, created = SellerWallet.objects.get_or_create(seller=request.user)
         
         # Get recent earnings
-        recent_earnings = Earning.objects.filter(shop=shop).order_by('-created_at')[:10]
+        recent_earnings = Earning.objects.filter(seller=request.user).order_by('-created_at')[:10]
         
         context.update({
             'total_products': total_products,
@@ -0,0 +1,114 @@
+"""
+Per-request SQL instrumentation.
+
+``QueryRecorder`` hooks ``connection.execute_wrapper`` so it works with
+``DEBUG = False`` and records every statement's SQL and duration.
+``QueryBudgetMiddleware`` wraps each request in a recorder, reports the
+totals in a ``Server-Timing`` header and logs requests that exceed their
+budget or repeat the same statement (the usual N+1 signature).
+
+Budgets default to ``QUERY_BUDGET_DEFAULT``; a view can declare its own with
+``@query_budget(n)``. ``manage.py check_query_budgets`` enforces them for
+every URL against seeded data.
+"""
+import logging
+import re
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LISTS = re.compile(r"\bIN \((?:%s|\?)(?:, ?(?:%s|\?))*\)")
+
+
+def normalize_sql(sql):
+    """Collapse literals and IN-lists so repeats of one statement compare equal."""
+    sql = _LITERALS.sub("?", sql)
+    return _IN_LISTS.sub("IN (...)", sql)
+
+
+class QueryRecorder:
+    """Context manager recording ``(sql, seconds)`` for every statement on ``using``."""
+
+    def __init__(self, using=None):
+        self.aliases = [using] if using else list(connections)
+        self.queries = []
+        self._contexts = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - start))
+
+    def __enter__(self):
+        for alias in self.aliases:
+            wrapper = connections[alias].execute_wrapper(self)
+            wrapper.__enter__()
+            self._contexts.append(wrapper)
+        return self
+
+    def __exit__(self, *exc_info):
+        while self._contexts:
+            self._contexts.pop().__exit__(*exc_info)
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def total_time(self):
+        return sum(duration for _, duration in self.queries)
+
+    def duplicates(self):
+        """``{normalized sql: times run}`` for statements run more than once."""
+        counts = Counter(normalize_sql(sql) for sql, _ in self.queries)
+        return {sql: times for sql, times in counts.items() if times > 1}
+
+    def summary(self):
+        duplicates = self.duplicates()
+        return (
+            f"{self.count} queries in {self.total_time * 1000:.1f}ms, "
+            f"{sum(duplicates.values()) - len(duplicates)} duplicates"
+        )
+
+
+def query_budget(max_queries):
+    """Declare the most queries a view may run per request."""
+    def decorator(view):
+        view.query_budget = max_queries
+        return view
+    return decorator
+
+
+class QueryBudgetMiddleware:
+    """Record SQL per request and flag requests that blow their budget."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.default_budget = getattr(settings, "QUERY_BUDGET_DEFAULT", 30)
+
+    def __call__(self, request):
+        request.query_budget = self.default_budget
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+
+        response.headers["Server-Timing"] = (
+            f'db;dur={recorder.total_time * 1000:.1f};desc="{recorder.count} queries"'
+        )
+        duplicates = recorder.duplicates()
+        if recorder.count > request.query_budget or duplicates:
+            logger.warning(
+                "%s %s: %s (budget %s)",
+                request.method, request.path, recorder.summary(), request.query_budget,
+                extra={"duplicate_sql": duplicates},
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_budget = getattr(view_func, "query_budget", self.default_budget)
@@ -49,6 +49,12 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
+# SQL count/time per request in a Server-Timing header; requests over their
+# budget (see karupatti_shop.querybudget) are logged as warnings.
+QUERY_BUDGET_DEFAULT = int(os.getenv("QUERY_BUDGET_DEFAULT", "30"))
+if DEBUG or os.getenv("QUERY_BUDGETS"):
+    MIDDLEWARE.insert(0, "karupatti_shop.querybudget.QueryBudgetMiddleware")
+
 ROOT_URLCONF = "karupatti_shop.urls"
 
 # -------------------- TEMPLATES --------------------
@@ -86,6 +92,57 @@ else:
         }
     }
 
+# -------------------- CACHE --------------------
+# Catalog versions and cached fragments must be shared by every worker, so
+# production uses REDIS_URL or, without it, the database cache table
+# (created by `manage.py createcachetable` in entrypoint.sh). Local memory
+# is per process and only used with DEBUG.
+if os.getenv("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.getenv("REDIS_URL"),
+            "KEY_PREFIX": "karupatti",
+        },
+        "carts": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.getenv("CART_REDIS_URL", os.getenv("REDIS_URL")),
+            "KEY_PREFIX": "karupatti-carts",
+        },
+    }
+elif DEBUG:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "karupatti",
+        },
+        "carts": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "karupatti-carts",
+        },
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+            "LOCATION": "karupatti_cache",
+        },
+        # A per-process cart cache would serve each worker its own stale
+        # copy; without Redis carts are read from store.CartLine every time
+        "carts": {
+            "BACKEND": "django.core.cache.backends.dummy.DummyCache",
+        },
+    }
+CATALOG_CACHE_TIMEOUT = int(os.getenv("CATALOG_CACHE_TIMEOUT", "900"))
+# Upper bound on caching the promotion discount map (it is also dropped at
+# every event start/end and on event edits, see promotions.pricing)
+PROMOTION_PRICES_TIMEOUT = int(os.getenv("PROMOTION_PRICES_TIMEOUT", "3600"))
+# Carts are cached whole under the "carts" alias and written through to
+# store.CartLine, so an evicted (or never cached) cart is simply reloaded
+# (see store.cart)
+CART_CACHE_ALIAS = "carts"
+CART_CACHE_TIMEOUT = int(os.getenv("CART_CACHE_TIMEOUT", str(60 * 60 * 24 * 7)))
+
 # -------------------- AUTH --------------------
 AUTH_USER_MODEL = 'accounts.CustomUser'
 AUTH_PASSWORD_VALIDATORS = []
@@ -104,6 +161,8 @@ STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
+# Resized upload derivatives (store.images) are built in this many processes
+IMAGE_DERIVATIVE_WORKERS = int(os.getenv("IMAGE_DERIVATIVE_WORKERS", "2"))
 
 # -------------------- LOGIN --------------------
 LOGIN_URL = 'accounts:login'
@@ -117,6 +176,20 @@ CSRF_TRUSTED_ORIGINS = [
 if _render_host:
     CSRF_TRUSTED_ORIGINS.append(f"https://{_render_host}")
 
+# -------------------- CHECKOUT --------------------
+# Seconds a signed checkout quote stays valid (see orders.quotes)
+CHECKOUT_QUOTE_TTL = int(os.getenv("CHECKOUT_QUOTE_TTL", str(15 * 60)))
+# Seconds stock stays held for an unpaid Stripe/PayPal order (see orders.holds)
+STOCK_HOLD_TTL = int(os.getenv("STOCK_HOLD_TTL", str(30 * 60)))
+# Seconds a request's idempotency key and stored response are kept (see orders.idempotency)
+IDEMPOTENCY_KEY_TTL = int(os.getenv("IDEMPOTENCY_KEY_TTL", str(24 * 60 * 60)))
+# Retry-After, in seconds, on the 409 for a repeat of a request that is still running
+IDEMPOTENCY_RETRY_AFTER = int(os.getenv("IDEMPOTENCY_RETRY_AFTER", "1"))
+
+# -------------------- PAYOUTS --------------------
+# Where payout batches write their settlement files (see payments.payouts)
+PAYOUT_SETTLEMENT_DIR = Path(os.getenv("PAYOUT_SETTLEMENT_DIR", str(BASE_DIR / "settlements")))
+
 # -------------------- STRIPE --------------------
 STRIPE_PUBLISHABLE_KEY = os.getenv("STRIPE_PUBLISHABLE_KEY", "")
 STRIPE_SECRET_KEY = os.getenv("STRIPE_SECRET_KEY", "")
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Order, OrderItem
+from .models import Order, OrderEvent, OrderItem, ShopOrder
 
 
 class OrderItemInline(admin.TabularInline):
@@ -8,13 +8,29 @@ class OrderItemInline(admin.TabularInline):
     readonly_fields = ['product_name', 'product_price', 'quantity', 'subtotal', 'seller_amount', 'platform_fee']
 
 
+class ShopOrderInline(admin.TabularInline):
+    model = ShopOrder
+    extra = 0
+    can_delete = False
+    fields = ['shop', 'status', 'item_count', 'subtotal', 'seller_amount', 'platform_fee']
+    readonly_fields = fields
+
+
+class OrderEventInline(admin.TabularInline):
+    model = OrderEvent
+    extra = 0
+    can_delete = False
+    fields = ['kind', 'status', 'payment_status', 'created_at', 'processed_at', 'attempts', 'last_error']
+    readonly_fields = fields
+
+
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     list_display = ['order_number', 'user', 'total_amount', 'payment_method', 'payment_status', 'status', 'created_at']
     list_filter = ['status', 'payment_status', 'payment_method', 'created_at']
     search_fields = ['order_number', 'user__username', 'user__email']
     readonly_fields = ['order_number', 'created_at', 'updated_at', 'paid_at']
-    inlines = [OrderItemInline]
+    inlines = [OrderItemInline, ShopOrderInline, OrderEventInline]
     
     fieldsets = (
         ('Order Information', {
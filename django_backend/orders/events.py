@@ -0,0 +1,135 @@
+"""
+Order lifecycle events.
+
+Saving an order whose ``status`` or ``payment_status`` changed writes an
+``OrderEvent`` in the same transaction (``Order.save`` is atomic and the
+event is written from its post_save handler), so the event log is a
+complete, ordered history of every order and doubles as an outbox: side
+effects that need not happen inside the order's transaction, such as
+crediting seller earnings, are registered with ``@handles(kind)``. They
+run in a ``transaction.on_commit`` callback once the change commits, and
+``manage.py process_order_events`` picks up whatever that missed.
+
+Each event is handled in its own transaction together with marking it
+processed, so a handler's writes and the event's ``processed_at`` commit
+or roll back as one. A failing event is retried by the worker until it
+has failed ``MAX_ATTEMPTS`` times.
+"""
+import logging
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import OrderEvent
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 100
+MAX_ATTEMPTS = 5
+
+# payment_status value -> event kind; status values are their own kinds
+PAYMENT_EVENTS = {
+    'pending': 'payment_pending',
+    'paid': 'paid',
+    'failed': 'payment_failed',
+    'refunded': 'refunded',
+}
+
+_handlers = defaultdict(list)
+
+
+def handles(*kinds):
+    """Register a worker handler, called with the ``OrderEvent``, for ``kinds``."""
+    def register(func):
+        for kind in kinds:
+            _handlers[kind].append(func)
+        return func
+    return register
+
+
+def _event(order, kind, payload=None):
+    return OrderEvent(
+        order=order,
+        kind=kind,
+        status=order.status,
+        payment_status=order.payment_status,
+        payload=payload or {},
+    )
+
+
+def record(order, kind, **payload):
+    """Append one event for ``order``, e.g. a refund that leaves its status alone."""
+    event = _event(order, kind, payload)
+    event.save()
+    handle_on_commit([event])
+    return event
+
+
+def record_transitions(order, created):
+    """Write the events for what changed since ``order`` was loaded; returns their kinds."""
+    if created:
+        previous = (None, None)
+        kinds = ['created']
+        if order.payment_status == 'paid':
+            kinds.append('paid')
+    else:
+        previous = getattr(order, '_loaded_state', (None, None))
+        kinds = []
+        if order.status != previous[0]:
+            kinds.append(order.status)
+        if order.payment_status != previous[1]:
+            kinds.append(PAYMENT_EVENTS.get(order.payment_status, order.payment_status))
+    if kinds:
+        payload = {'status_from': previous[0], 'payment_status_from': previous[1]}
+        created_events = OrderEvent.objects.bulk_create([_event(order, kind, payload) for kind in kinds])
+        handle_on_commit(created_events)
+    order._loaded_state = (order.status, order.payment_status)
+    return kinds
+
+
+def handle_on_commit(created_events):
+    """Run the handlers for ``created_events`` as soon as their transaction commits."""
+    ids = [event.pk for event in created_events if _handlers.get(event.kind)]
+    if ids:
+        transaction.on_commit(lambda: [handle(pk) for pk in ids])
+
+
+def handle(pk):
+    """
+    Run one event's handlers and mark it processed, in one transaction.
+
+    Returns ``False`` if it failed (the failure is recorded for the next
+    attempt) or was already taken.
+    """
+    try:
+        with transaction.atomic():
+            event = (
+                OrderEvent.objects.select_for_update(skip_locked=True)
+                .select_related('order')
+                .filter(pk=pk, processed_at__isnull=True)
+                .first()
+            )
+            if event is None:
+                # Already processed, or another worker has it
+                return False
+            for handler in _handlers.get(event.kind, ()):
+                handler(event)
+            event.processed_at = timezone.now()
+            event.save(update_fields=['processed_at'])
+        return True
+    except Exception as exc:
+        logger.exception("Order event %s failed", pk)
+        OrderEvent.objects.filter(pk=pk).update(attempts=F('attempts') + 1, last_error=str(exc)[:1000])
+        return False
+
+
+def process_pending(batch_size=BATCH_SIZE):
+    """Run the handlers for one batch of unprocessed events; returns how many were handled."""
+    ids = list(
+        OrderEvent.objects.filter(processed_at__isnull=True, attempts__lt=MAX_ATTEMPTS)
+        .order_by('id')
+        .values_list('pk', flat=True)[:batch_size]
+    )
+    return sum(handle(pk) for pk in ids)
@@ -0,0 +1,165 @@
+"""
+Stock reservations for orders paid online.
+
+Cash-on-delivery orders take stock when they are placed. Stripe and PayPal
+orders instead put a ``StockHold`` on each product for ``STOCK_HOLD_TTL``
+seconds and add it to ``Product.reserved``, so available-to-sell
+(``stock - reserved``) is read from the product row rather than summed from
+holds. When the payment is confirmed the holds turn into a stock decrement;
+when the buyer cancels, or the hold expires, they are released.
+``manage.py release_expired_holds`` sweeps expired holds in batches and
+cancels their unpaid orders; if one of those is paid after all, its stock
+is taken again where it is still available.
+"""
+import logging
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Now
+from django.utils import timezone
+
+from store import cards, inventory
+from store.models import Product
+from . import events
+from .models import Order, OrderEvent, ShopOrder, StockHold
+
+logger = logging.getLogger(__name__)
+
+SWEEP_BATCH_SIZE = 500
+
+
+def hold_ttl():
+    return timedelta(seconds=getattr(settings, 'STOCK_HOLD_TTL', 30 * 60))
+
+
+def hold_stock(order, lines):
+    """
+    Reserve each ``(product id, qty)`` for ``order``; returns the ids that were short.
+
+    Call inside the transaction that creates the order so a short line
+    rolls back the holds already taken.
+    """
+    short = []
+    for product_id, qty in sorted(lines):
+        held = Product.objects.filter(pk=product_id, stock__gte=F('reserved') + qty).update(
+            reserved=F('reserved') + qty, updated_at=Now()
+        )
+        if not held:
+            short.append(product_id)
+    if not short:
+        expires_at = timezone.now() + hold_ttl()
+        StockHold.objects.bulk_create([
+            StockHold(order=order, product_id=product_id, quantity=qty, expires_at=expires_at)
+            for product_id, qty in lines
+        ])
+    return short
+
+
+def _unreserve(holds):
+    totals = Counter()
+    for product_id, qty in holds:
+        totals[product_id] += qty
+    for product_id, qty in sorted(totals.items()):
+        Product.objects.filter(pk=product_id).update(reserved=F('reserved') - qty, updated_at=Now())
+    return list(totals)
+
+
+def commit_holds(order):
+    """The order was paid: turn its holds, if any are left, into a stock decrement."""
+    with transaction.atomic():
+        holds = list(
+            StockHold.objects.select_for_update().filter(order=order).values_list('pk', 'product_id', 'quantity')
+        )
+        if not holds:
+            if order.status == 'cancelled':
+                _take_after_expiry(order)
+            return
+        for _, product_id, qty in sorted(holds, key=lambda hold: hold[1]):
+            Product.objects.filter(pk=product_id).update(
+                stock=F('stock') - qty, reserved=F('reserved') - qty, updated_at=Now()
+            )
+        StockHold.objects.filter(pk__in=[pk for pk, _, _ in holds]).delete()
+        inventory.record([(product_id, -qty) for _, product_id, qty in holds], 'sale', order)
+
+
+def _take_after_expiry(order):
+    """
+    The order was paid after its hold expired and its units went back on sale.
+
+    Take whatever is still available, line by line, and flag the order with a
+    ``stock_short`` event for the products that could not be covered.
+    """
+    lines = [
+        (product_id, qty)
+        for product_id, qty in order.items.values_list('product_id', 'quantity')
+        if product_id and qty
+    ]
+    short = []
+    for line in sorted(lines):
+        short += inventory.take_stock([line], order)
+    taken = [product_id for product_id, _ in lines if product_id not in short]
+    if taken:
+        transaction.on_commit(lambda: cards.sync_stock(taken))
+    if short:
+        logger.error("Order %s was paid after its stock hold expired; short on products %s", order.order_number, short)
+        events.record(order, 'stock_short', product_ids=short)
+
+
+def release_holds(holds):
+    """Return the units held by ``holds`` (a queryset); returns the ids of their orders."""
+    with transaction.atomic():
+        rows = list(holds.select_for_update().values_list('pk', 'order_id', 'product_id', 'quantity'))
+        if not rows:
+            return set()
+        product_ids = _unreserve([(product_id, qty) for _, _, product_id, qty in rows])
+        StockHold.objects.filter(pk__in=[row[0] for row in rows]).delete()
+        transaction.on_commit(lambda: cards.sync_stock(product_ids))
+    return {row[1] for row in rows}
+
+
+def release_expired(batch_size=SWEEP_BATCH_SIZE, now=None):
+    """Release expired holds in batches and cancel their unpaid orders; returns orders cancelled."""
+    now = now or timezone.now()
+    cancelled = 0
+    while True:
+        batch = list(
+            StockHold.objects.filter(expires_at__lte=now)
+            .order_by('expires_at')
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        if not batch:
+            return cancelled
+        order_ids = release_holds(StockHold.objects.filter(pk__in=batch))
+        cancelled += _cancel_unpaid(order_ids)
+
+
+def _cancel_unpaid(order_ids):
+    """Cancel those of ``order_ids`` still awaiting payment, with their events."""
+    with transaction.atomic():
+        orders = list(
+            Order.objects.select_for_update()
+            .filter(pk__in=order_ids, status='pending', payment_status='pending')
+        )
+        if not orders:
+            return 0
+        updated_at = timezone.now()
+        Order.objects.filter(pk__in=[order.pk for order in orders]).update(status='cancelled', updated_at=updated_at)
+        ShopOrder.objects.filter(order__in=orders).update(status='cancelled', updated_at=updated_at)
+        events.handle_on_commit(OrderEvent.objects.bulk_create([
+            OrderEvent(
+                order=order,
+                kind='cancelled',
+                status='cancelled',
+                payment_status=order.payment_status,
+                payload={
+                    'status_from': order.status,
+                    'payment_status_from': order.payment_status,
+                    'reason': 'hold_expired',
+                },
+            )
+            for order in orders
+        ]))
+    return len(orders)
@@ -0,0 +1,144 @@
+"""
+Idempotency keys for requests that must not run twice.
+
+Views wrapped in ``@idempotent`` look for a key in the ``Idempotency-Key``
+header (API and mobile clients) or an ``idempotency_key`` form field
+(rendered by ``{% idempotency_key %}`` from ``orders.templatetags``). The
+first request with a key claims an ``IdempotencyRecord`` and, once the
+view returns, stores its response there; repeats of that key by the same
+user get the stored response back without running the view again. A
+repeat that arrives while the first is still running gets 409 at once,
+with a ``Retry-After`` of ``IDEMPOTENCY_RETRY_AFTER`` seconds, rather than
+tying up a worker while it waits. Reusing a key for a different request is
+a 422.
+
+Server errors are not stored, so the client can retry them. Records expire
+after ``IDEMPOTENCY_KEY_TTL`` seconds; ``manage.py prune_idempotency_records``
+deletes expired ones.
+"""
+import hashlib
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse
+from django.utils import timezone
+
+from .models import IdempotencyRecord
+
+HEADER = 'Idempotency-Key'
+FIELD = 'idempotency_key'
+MAX_KEY_LENGTH = 64
+PRUNE_BATCH_SIZE = 1000
+
+# Response headers replayed along with the status and body
+REPLAYED_HEADERS = ('Content-Type', 'Location')
+
+
+def key_ttl():
+    return timedelta(seconds=getattr(settings, 'IDEMPOTENCY_KEY_TTL', 24 * 60 * 60))
+
+
+def request_key(request):
+    key = request.headers.get(HEADER) or request.POST.get(FIELD) or ''
+    return key.strip()[:MAX_KEY_LENGTH]
+
+
+def fingerprint(request):
+    """Hash of what the request asks for, so a key cannot be reused for something else."""
+    digest = hashlib.sha256(f"{request.method} {request.path}".encode())
+    for name, values in sorted(request.POST.lists()):
+        if name not in (FIELD, 'csrfmiddlewaretoken'):
+            digest.update(f"\n{name}={values!r}".encode())
+    for name, files in sorted(request.FILES.lists()):
+        digest.update(f"\n{name}:{[(f.name, f.size) for f in files]!r}".encode())
+    if request.content_type == 'application/json':
+        digest.update(b"\n" + request.body)
+    return digest.hexdigest()
+
+
+def _claim(user, scope, key, request_hash):
+    """Create the record for a new key; returns ``None`` when one already exists."""
+    now = timezone.now()
+    IdempotencyRecord.objects.filter(user=user, scope=scope, key=key, expires_at__lte=now).delete()
+    try:
+        with transaction.atomic():
+            return IdempotencyRecord.objects.create(
+                user=user, scope=scope, key=key, request_hash=request_hash, expires_at=now + key_ttl(),
+            )
+    except IntegrityError:
+        return None
+
+
+def _replay(record):
+    response = HttpResponse(bytes(record.response_body), status=record.status_code)
+    for name, value in record.response_headers.items():
+        response[name] = value
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _store(record, response):
+    if response.streaming or response.status_code >= 500:
+        # Nothing worth replaying; let the client try again
+        record.delete()
+        return
+    record.status_code = response.status_code
+    record.response_body = response.content
+    record.response_headers = {name: response[name] for name in REPLAYED_HEADERS if response.has_header(name)}
+    record.save(update_fields=['status_code', 'response_body', 'response_headers'])
+
+
+def idempotent(view=None, *, scope=None):
+    """Run ``view`` at most once per user, scope and idempotency key."""
+    def decorator(view):
+        view_scope = scope or f"{view.__module__}.{view.__name__}"
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            key = request_key(request)
+            if request.method != 'POST' or not key or not request.user.is_authenticated:
+                return view(request, *args, **kwargs)
+
+            request_hash = fingerprint(request)
+            record = _claim(request.user, view_scope, key, request_hash)
+            if record is None:
+                return _repeat(request.user, view_scope, key, request_hash)
+            try:
+                response = view(request, *args, **kwargs)
+            except BaseException:
+                record.delete()
+                raise
+            _store(record, response)
+            return response
+        return wrapper
+
+    return decorator(view) if view is not None else decorator
+
+
+def _repeat(user, scope, key, request_hash):
+    """Answer a request whose key was already claimed."""
+    record = IdempotencyRecord.objects.filter(user=user, scope=scope, key=key).first()
+    if record is None:
+        return HttpResponse('The original request failed; please try again.', status=409)
+    if record.request_hash != request_hash:
+        return HttpResponse('This idempotency key was used for a different request.', status=422)
+    if record.status_code is not None:
+        return _replay(record)
+    response = HttpResponse('This request is already being processed.', status=409)
+    response['Retry-After'] = str(getattr(settings, 'IDEMPOTENCY_RETRY_AFTER', 1))
+    return response
+
+
+def prune_expired(batch_size=PRUNE_BATCH_SIZE, now=None):
+    """Delete expired records in batches; returns how many."""
+    now = now or timezone.now()
+    removed = 0
+    while True:
+        batch = list(
+            IdempotencyRecord.objects.filter(expires_at__lte=now).values_list('pk', flat=True)[:batch_size]
+        )
+        if not batch:
+            return removed
+        removed += IdempotencyRecord.objects.filter(pk__in=batch).delete()[0]
@@ -0,0 +1,70 @@
+# Generated by Django 5.2 on 2026-10-18 09:43
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def split_existing_orders(apps, schema_editor):
+    """Write the per-shop part of every order placed so far."""
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    ShopOrder = apps.get_model('orders', 'ShopOrder')
+    rows = (
+        OrderItem.objects.filter(shop__isnull=False)
+        .values('order', 'shop', 'order__order_number', 'order__status', 'order__created_at')
+        .annotate(
+            units=Sum('quantity'),
+            total=Sum('subtotal'),
+            fee=Sum('platform_fee'),
+            earned=Sum('seller_amount'),
+        )
+        .order_by('order')
+    )
+    ShopOrder.objects.bulk_create([
+        ShopOrder(
+            order_id=row['order'],
+            shop_id=row['shop'],
+            order_number=row['order__order_number'],
+            status=row['order__status'],
+            item_count=row['units'],
+            subtotal=row['total'],
+            platform_fee=row['fee'],
+            seller_amount=row['earned'],
+            created_at=row['order__created_at'],
+        )
+        for row in rows.iterator()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0002_stockhold'),
+        ('shops', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShopOrder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order_number', models.CharField(max_length=32)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('shipped', 'Shipped'), ('delivered', 'Delivered'), ('cancelled', 'Cancelled')], default='pending', max_length=20)),
+                ('item_count', models.PositiveIntegerField(default=0)),
+                ('subtotal', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('platform_fee', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('seller_amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shop_orders', to='orders.order')),
+                ('shop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shop_orders', to='shops.shop')),
+            ],
+            options={
+                'ordering': ['-created_at', '-id'],
+                'indexes': [models.Index(fields=['shop', '-created_at', '-id'], name='orders_shoporder_shop_idx'), models.Index(fields=['shop', 'status', '-created_at', '-id'], name='orders_shoporder_status_idx')],
+                'constraints': [models.UniqueConstraint(fields=('shop', 'order_number'), name='orders_shoporder_unique')],
+            },
+        ),
+        migrations.RunPython(split_existing_orders, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2 on 2026-10-18 09:46
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def start_history(apps, schema_editor):
+    """Give every existing order a handled ``created`` event to start its history."""
+    Order = apps.get_model('orders', 'Order')
+    OrderEvent = apps.get_model('orders', 'OrderEvent')
+    now = django.utils.timezone.now()
+    OrderEvent.objects.bulk_create([
+        OrderEvent(
+            order_id=pk, kind='created', status=status, payment_status=payment_status,
+            created_at=created_at, processed_at=now,
+        )
+        for pk, status, payment_status, created_at in Order.objects.order_by('pk')
+        .values_list('pk', 'status', 'payment_status', 'created_at')
+        .iterator()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0003_shop_order'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('created', 'Created'), ('pending', 'Pending'), ('processing', 'Processing'), ('shipped', 'Shipped'), ('delivered', 'Delivered'), ('cancelled', 'Cancelled'), ('payment_pending', 'Payment pending'), ('paid', 'Paid'), ('payment_failed', 'Payment failed'), ('refunded', 'Refunded')], max_length=20)),
+                ('status', models.CharField(max_length=20)),
+                ('payment_status', models.CharField(max_length=20)),
+                ('payload', models.JSONField(blank=True, default=dict)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='orders.order')),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['order', 'id'], name='orders_event_order_idx'), models.Index(condition=models.Q(('processed_at__isnull', True)), fields=['id'], name='orders_event_pending_idx')],
+            },
+        ),
+        migrations.RunPython(start_history, migrations.RunPython.noop),
+    ]
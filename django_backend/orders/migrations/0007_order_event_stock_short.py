@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 10:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0006_idempotency_record'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='orderevent',
+            name='kind',
+            field=models.CharField(choices=[('created', 'Created'), ('pending', 'Pending'), ('processing', 'Processing'), ('shipped', 'Shipped'), ('delivered', 'Delivered'), ('cancelled', 'Cancelled'), ('payment_pending', 'Payment pending'), ('paid', 'Paid'), ('payment_failed', 'Payment failed'), ('refunded', 'Refunded'), ('stock_short', 'Paid without stock')], max_length=20),
+        ),
+    ]
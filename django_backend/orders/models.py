@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 from accounts.models import CustomUser, Address
 from store.models import Product
@@ -64,14 +64,27 @@ class Order(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Buyer order history, keyset-paginated (orders.views.order_list)
+            models.Index(fields=['user', '-created_at', '-id'], name='orders_order_user_new_idx'),
+        ]
     
     def __str__(self):
         return f"Order {self.order_number}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Transitions are logged relative to this (orders.events.record_transitions)
+        instance._loaded_state = (instance.__dict__.get('status'), instance.__dict__.get('payment_status'))
+        return instance
+    
     def save(self, *args, **kwargs):
         if not self.order_number:
             self.order_number = self.generate_order_number()
-        super().save(*args, **kwargs)
+        # The post_save handler writes the order's events in this transaction
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
     
     @staticmethod
     def generate_order_number():
@@ -106,3 +119,126 @@ class OrderItem(models.Model):
     def save(self, *args, **kwargs):
         self.subtotal = self.product_price * self.quantity
         super().save(*args, **kwargs)
+
+
+class StockHold(models.Model):
+    """
+    Units of a product set aside for an order awaiting online payment.
+    
+    ``Product.reserved`` is the sum of a product's holds; see ``orders.holds``.
+    """
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='stock_holds')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_holds')
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} for order {self.order_id}"
+
+
+class ShopOrder(models.Model):
+    """
+    One shop's part of an order, written with the order at checkout.
+    
+    Seller screens list and count these instead of scanning ``OrderItem``.
+    ``status`` follows the order's status (see ``orders.signals``).
+    """
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='shop_orders')
+    shop = models.ForeignKey(Shop, on_delete=models.CASCADE, related_name='shop_orders')
+    order_number = models.CharField(max_length=32)
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES, default='pending')
+    
+    item_count = models.PositiveIntegerField(default=0)
+    subtotal = models.DecimalField(max_digits=10, decimal_places=2)
+    platform_fee = models.DecimalField(max_digits=10, decimal_places=2)
+    seller_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-created_at', '-id']
+        constraints = [
+            models.UniqueConstraint(fields=['shop', 'order_number'], name='orders_shoporder_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['shop', '-created_at', '-id'], name='orders_shoporder_shop_idx'),
+            models.Index(fields=['shop', 'status', '-created_at', '-id'], name='orders_shoporder_status_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.order_number} - {self.shop_id}"
+
+
+class OrderEvent(models.Model):
+    """
+    One step in an order's life, written with the change (see ``orders.events``).
+    
+    ``status`` and ``payment_status`` are the order's values after the
+    event; ``processed_at`` is set once the worker has run its handlers.
+    """
+    KIND_CHOICES = [
+        ('created', 'Created'),
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('shipped', 'Shipped'),
+        ('delivered', 'Delivered'),
+        ('cancelled', 'Cancelled'),
+        ('payment_pending', 'Payment pending'),
+        ('paid', 'Paid'),
+        ('payment_failed', 'Payment failed'),
+        ('refunded', 'Refunded'),
+        ('stock_short', 'Paid without stock'),
+    ]
+    
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='events')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    status = models.CharField(max_length=20)
+    payment_status = models.CharField(max_length=20)
+    payload = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    # Outbox bookkeeping
+    processed_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['order', 'id'], name='orders_event_order_idx'),
+            models.Index(
+                fields=['id'], name='orders_event_pending_idx', condition=models.Q(processed_at__isnull=True)
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.kind} for order {self.order_id}"
+
+
+class IdempotencyRecord(models.Model):
+    """
+    A request key and the response it produced (see ``orders.idempotency``).
+    
+    ``status_code`` stays empty while the first request is still running.
+    """
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='+')
+    scope = models.CharField(max_length=100)
+    key = models.CharField(max_length=64)
+    request_hash = models.CharField(max_length=64)
+    
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.BinaryField(blank=True, default=b'')
+    response_headers = models.JSONField(default=dict, blank=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'scope', 'key'], name='orders_idempotency_unique'),
+        ]
+    
+    def __str__(self):
+        return f"{self.scope} {self.key}"
@@ -0,0 +1,126 @@
+"""
+Order placement.
+
+``place_order`` writes the stock decrements (or, for orders paid online,
+the stock holds), the order, its items, one ``ShopOrder`` per shop and the
+coupon usage as one transaction. Stock is taken with one conditional
+``UPDATE ... SET stock = stock - n WHERE id = ... AND stock - reserved >= n``
+per product (see ``store.inventory`` and ``orders.holds``), so concurrent checkouts cannot oversell;
+when any line is short the transaction rolls back and ``OutOfStock`` lists
+the products.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F
+
+from promotions.models import Coupon, CouponUsage
+from store import cards
+from store.inventory import take_stock
+from .holds import hold_stock
+from .models import Order, OrderItem, ShopOrder
+
+PLATFORM_FEE_RATE = Decimal('0.10')
+
+
+class OutOfStock(Exception):
+    """Some quoted lines are no longer in stock; nothing was written"""
+
+    def __init__(self, products):
+        self.products = products
+        super().__init__(', '.join(product.name for product in products))
+
+
+def place_order(user, address, quote, products, payment_method):
+    """
+    Create the order for a validated ``quote`` (see ``orders.quotes``).
+
+    ``products`` maps product ids to the ``Product`` rows the quote was
+    validated against. Raises ``OutOfStock`` without writing anything.
+    """
+    lines = [(line.product_id, line.qty) for line in quote.lines]
+    with transaction.atomic():
+        order = Order.objects.create(
+            user=user,
+            shipping_address=address,
+            shipping_full_name=address.full_name,
+            shipping_phone=address.phone,
+            shipping_street=address.street_address,
+            shipping_city=address.city,
+            shipping_state=address.state,
+            shipping_country=address.country,
+            shipping_postal_code=address.postal_code,
+            subtotal=quote.subtotal,
+            shipping_cost=quote.shipping_cost,
+            tax=quote.tax,
+            discount=quote.discount,
+            total_amount=quote.total,
+            payment_method=payment_method,
+            status='processing' if payment_method == 'cod' else 'pending',
+        )
+
+        items = []
+        for line in quote.lines:
+            product = products[line.product_id]
+            platform_fee = line.line_total * PLATFORM_FEE_RATE
+            items.append(OrderItem(
+                order=order,
+                product=product,
+                shop=product.shop,
+                product_name=product.name,
+                product_price=line.price,
+                quantity=line.qty,
+                subtotal=line.line_total,
+                seller_amount=line.line_total - platform_fee,
+                platform_fee=platform_fee,
+            ))
+        OrderItem.objects.bulk_create(items)
+        ShopOrder.objects.bulk_create(split_by_shop(order, items))
+
+        if payment_method == 'cod':
+            short = take_stock(lines, order)
+        else:
+            # Paid online: hold the stock until the payment is confirmed
+            short = hold_stock(order, lines)
+        if short:
+            raise OutOfStock([products[product_id] for product_id in short])
+
+        if quote.coupon_code:
+            coupon = Coupon.objects.filter(code=quote.coupon_code).first()
+            if coupon is not None:
+                CouponUsage.objects.create(
+                    coupon=coupon,
+                    user=user,
+                    order_number=order.order_number,
+                    discount_amount=quote.discount,
+                )
+                Coupon.objects.filter(pk=coupon.pk).update(times_used=F('times_used') + 1)
+
+        product_ids = [product_id for product_id, _ in lines]
+        transaction.on_commit(lambda: cards.sync_stock(product_ids))
+    return order
+
+
+def split_by_shop(order, items):
+    """One unsaved ``ShopOrder`` per shop among ``items``, with that shop's totals."""
+    shop_orders = {}
+    for item in items:
+        if item.shop_id is None:
+            continue
+        shop_order = shop_orders.get(item.shop_id)
+        if shop_order is None:
+            shop_order = shop_orders[item.shop_id] = ShopOrder(
+                order=order,
+                shop_id=item.shop_id,
+                order_number=order.order_number,
+                status=order.status,
+                subtotal=Decimal('0'),
+                platform_fee=Decimal('0'),
+                seller_amount=Decimal('0'),
+                created_at=order.created_at,
+            )
+        shop_order.item_count += item.quantity
+        shop_order.subtotal += item.subtotal
+        shop_order.platform_fee += item.platform_fee
+        shop_order.seller_amount += item.seller_amount
+    return list(shop_orders.values())
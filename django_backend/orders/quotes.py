@@ -0,0 +1,149 @@
+"""
+Signed checkout quotes.
+
+The checkout page prices the cart once and hands the result to the browser
+as a signed token (``django.core.signing``) in the checkout form, so
+``create_order`` charges exactly what was shown without pricing the cart
+again. A quote carries each line's unit price and a version of what that
+price depends on (``price_version``: the list price and the promotion
+applied), the totals, the coupon and an expiry, and is bound to the user
+it was made for. Stock is deliberately not part of the version, so sales
+to other buyers do not void open quotes.
+
+Placing the order checks that the cart still holds the quoted lines and
+that none of their prices changed since, in one query. Quotes expire after
+``CHECKOUT_QUOTE_TTL`` seconds, or sooner when a promotion starts or ends.
+"""
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.conf import settings
+from django.core import signing
+from django.utils import timezone
+
+QUOTE_SALT = 'orders.quote'
+SHIPPING_COST = Decimal('10.00')
+TAX_RATE = Decimal('0.08')
+
+
+class QuoteError(Exception):
+    """The quote is expired, tampered with or no longer matches the cart"""
+
+
+def price_version(product):
+    """What a quoted price depends on, for a product that went through ``apply_prices``."""
+    return f"{product.price}:{getattr(product, 'sale_event_id', None) or ''}"
+
+
+class QuoteLine:
+    def __init__(self, product_id, qty, price, version):
+        self.product_id = product_id
+        self.qty = qty
+        self.price = price
+        self.version = version
+
+    @property
+    def line_total(self):
+        return self.price * self.qty
+
+
+class Quote:
+    def __init__(self, user_id, lines, discount, coupon_code, expires_at, shipping_cost=SHIPPING_COST, id=None):
+        self.id = id or uuid.uuid4().hex
+        self.user_id = user_id
+        self.lines = lines
+        self.discount = discount
+        self.coupon_code = coupon_code
+        self.expires_at = expires_at
+        self.shipping_cost = shipping_cost
+
+    @property
+    def subtotal(self):
+        return sum((line.line_total for line in self.lines), Decimal('0'))
+
+    @property
+    def tax(self):
+        return self.subtotal * TAX_RATE
+
+    @property
+    def total(self):
+        return self.subtotal + self.shipping_cost + self.tax - self.discount
+
+    @classmethod
+    def for_cart(cls, cart, user, applied_coupon=None):
+        """Price ``cart`` once for ``user``, with the session's applied coupon."""
+        from promotions.pricing import discount_map
+
+        now = timezone.now()
+        expires_at = now + timedelta(seconds=getattr(settings, 'CHECKOUT_QUOTE_TTL', 15 * 60))
+        valid_until = discount_map().valid_until
+        if valid_until is not None:
+            expires_at = min(expires_at, valid_until)
+
+        applied_coupon = applied_coupon or {}
+        return cls(
+            user_id=user.pk,
+            lines=[
+                QuoteLine(item.product.pk, item.qty, item.price, price_version(item.product))
+                for item in cart.lines
+            ],
+            discount=Decimal(str(applied_coupon.get('discount', '0'))),
+            coupon_code=applied_coupon.get('code'),
+            expires_at=expires_at,
+        )
+
+    def sign(self):
+        return signing.dumps({
+            'id': self.id,
+            'user': self.user_id,
+            'lines': [
+                [line.product_id, line.qty, str(line.price), line.version] for line in self.lines
+            ],
+            'shipping': str(self.shipping_cost),
+            'discount': str(self.discount),
+            'coupon': self.coupon_code,
+            'expires': int(self.expires_at.timestamp()),
+        }, salt=QUOTE_SALT, compress=True)
+
+    @classmethod
+    def from_token(cls, token, user):
+        """Unsign a quote made for ``user``; raises ``QuoteError``."""
+        try:
+            data = signing.loads(token or '', salt=QUOTE_SALT)
+        except signing.BadSignature:
+            raise QuoteError('Your checkout session is invalid. Please review your order again.')
+        expires_at = datetime.fromtimestamp(data['expires'], tz=dt_timezone.utc)
+        if data['user'] != user.pk or expires_at <= timezone.now():
+            raise QuoteError('Your checkout session has expired. Please review your order again.')
+        return cls(
+            user_id=data['user'],
+            lines=[
+                QuoteLine(product_id, qty, Decimal(price), version)
+                for product_id, qty, price, version in data['lines']
+            ],
+            discount=Decimal(data['discount']),
+            coupon_code=data['coupon'],
+            expires_at=expires_at,
+            shipping_cost=Decimal(data['shipping']),
+            id=data['id'],
+        )
+
+    def validate(self, cart, applied_coupon=None):
+        """
+        Check the quote still describes ``cart``; returns ``{product id: Product}``.
+
+        The cart's active lines (one query) must be the quoted ones, at the
+        same price version. Raises ``QuoteError`` otherwise.
+        """
+        products = {item.product.pk: item.product for item in cart.lines}
+        in_cart = {str(item.product.pk): item.qty for item in cart.lines}
+        quoted = {str(line.product_id): line.qty for line in self.lines}
+        coupon_code = (applied_coupon or {}).get('code')
+        if quoted != in_cart or coupon_code != self.coupon_code:
+            raise QuoteError('Your cart changed during checkout. Please review your order again.')
+
+        for line in self.lines:
+            if price_version(products[line.product_id]) != line.version:
+                raise QuoteError('Some items in your cart changed. Please review your order again.')
+        return products
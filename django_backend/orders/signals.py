@@ -1,29 +1,40 @@
 from django.db.models.signals import post_save
 from django.dispatch import receiver
-from .models import Order, OrderItem
-from payments.models import SellerWallet, Earning
+from . import events
+from .holds import commit_holds
+from .models import Order, ShopOrder
+from payments import ledger
+from payments.models import Earning
 
 
 @receiver(post_save, sender=Order)
-def handle_order_payment(sender, instance, created, **kwargs):
-    """Handle order payment and distribute earnings"""
-    if instance.payment_status == 'paid' and not created:
-        # Check if earnings already distributed
-        if not Earning.objects.filter(order_id=str(instance.id)).exists():
-            # Distribute earnings to sellers
-            for item in instance.items.all():
-                if item.shop and item.shop.owner:
-                    # Create earning record
-                    Earning.objects.create(
-                        seller=item.shop.owner,
-                        order_id=str(instance.id),
-                        order_item_id=str(item.id),
-                        amount=item.seller_amount,
-                        platform_fee=item.platform_fee
-                    )
-                    
-                    # Update seller wallet
-                    wallet, _ = SellerWallet.objects.get_or_create(seller=item.shop.owner)
-                    wallet.balance += item.seller_amount
-                    wallet.total_earned += item.seller_amount
-                    wallet.save()
+def record_order_transitions(sender, instance, created, raw=False, **kwargs):
+    """Log status/payment changes and apply the ones that cannot wait for the worker"""
+    if raw:
+        return
+    kinds = events.record_transitions(instance, created)
+    if not kinds or created:
+        return
+    if 'paid' in kinds:
+        # Stock held while the payment was pending is now sold
+        commit_holds(instance)
+    # Sellers see the order's status on their part of it
+    ShopOrder.objects.filter(order=instance).exclude(status=instance.status).update(
+        status=instance.status, updated_at=instance.updated_at
+    )
+
+
+@events.handles('paid')
+def distribute_earnings(event):
+    """Credit each seller for their items in a paid order"""
+    order = event.order
+    # Check if earnings already distributed
+    if Earning.objects.filter(order_id=str(order.id)).exists():
+        return
+    # One query for every line's seller; the ledger groups them per seller
+    lines = order.items.filter(shop__isnull=False).values_list(
+        'shop__owner_id', 'id', 'seller_amount', 'platform_fee'
+    )
+    ledger.post_earnings(str(order.id), [
+        (seller_id, str(item_id), amount, fee) for seller_id, item_id, amount, fee in lines
+    ])
@@ -0,0 +1,14 @@
+import uuid
+
+from django import template
+from django.utils.html import format_html
+
+from orders.idempotency import FIELD
+
+register = template.Library()
+
+
+@register.simple_tag
+def idempotency_key():
+    """Hidden field giving each rendering of a form its own idempotency key"""
+    return format_html('<input type="hidden" name="{}" value="{}">', FIELD, uuid.uuid4().hex)
@@ -2,69 +2,47 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.conf import settings
+from django.db.models import IntegerField, OuterRef, Subquery, Sum
 from django.http import JsonResponse
-from decimal import Decimal
+from django.urls import reverse
 from .models import Order, OrderItem
+from .holds import release_holds
+from .idempotency import idempotent
+from .placement import OutOfStock, place_order
+from .quotes import Quote, QuoteError
 from accounts.models import Address
+from store.cart import Cart
+from store.inventory import restock
 from store.models import Product
-from promotions.models import Coupon, CouponUsage
+from store.pagination import paginate, wants_json
 import json
 
 
 @login_required
 def checkout(request):
     """Checkout page"""
-    cart = request.session.get('cart', {})
+    cart = Cart(request)
     
     if not cart:
         messages.warning(request, 'Your cart is empty.')
         return redirect('store:product_list')
     
-    # Calculate cart totals
-    cart_items = []
-    subtotal = Decimal('0')
-    
-    for product_id, item_data in cart.items():
-        try:
-            product = Product.objects.get(id=product_id, is_active=True)
-            if isinstance(item_data, dict):
-                quantity = item_data.get('qty', 1)
-            else:
-                quantity = item_data  # item_data is already an int
-            
-            item_total = product.price * quantity
-            
-            cart_items.append({
-                'product': product,
-                'quantity': quantity,
-                'total': item_total
-            })
-            subtotal += item_total
-        except Product.DoesNotExist:
-            continue
-    
-    # Calculate totals
-    shipping_cost = Decimal('10.00')
-    tax = subtotal * Decimal('0.08')
-    
-    discount = Decimal('0')
+    # Price the cart once; create_order charges exactly this quote
     applied_coupon = request.session.get('applied_coupon')
-    if applied_coupon:
-        discount = Decimal(str(applied_coupon.get('discount', '0')))
-    
-    total = subtotal + shipping_cost + tax - discount
+    quote = Quote.for_cart(cart, request.user, applied_coupon)
     
     # Get user addresses
     addresses = Address.objects.filter(user=request.user)
     default_address = addresses.filter(is_default=True).first()
     
     context = {
-        'cart_items': cart_items,
-        'subtotal': subtotal,
-        'shipping_cost': shipping_cost,
-        'tax': tax,
-        'discount': discount,
-        'total': total,
+        'cart_items': cart.lines,
+        'quote': quote.sign(),
+        'subtotal': quote.subtotal,
+        'shipping_cost': quote.shipping_cost,
+        'tax': quote.tax,
+        'discount': quote.discount,
+        'total': quote.total,
         'addresses': addresses,
         'default_address': default_address,
         'applied_coupon': applied_coupon,
@@ -75,12 +53,13 @@ def checkout(request):
 
 
 @login_required
+@idempotent
 def create_order(request):
     """Create order from cart"""
     if request.method != 'POST':
         return redirect('orders:checkout')
     
-    cart = request.session.get('cart', {})
+    cart = Cart(request)
     if not cart:
         messages.error(request, 'Your cart is empty.')
         return redirect('store:product_list')
@@ -96,112 +75,28 @@ def create_order(request):
     # Get address
     address = get_object_or_404(Address, id=address_id, user=request.user)
     
-    # Calculate totals
-    subtotal = Decimal('0')
-    cart_items = []
-    
-    for product_id, item_data in cart.items():
-        try:
-            product = Product.objects.get(id=product_id, is_active=True)
-            if isinstance(item_data, dict):
-                quantity = item_data.get('qty', 1)
-            else:
-                quantity = item_data  # item_data is already an int
-            
-            item_total = product.price * quantity
-            
-            cart_items.append({
-                'product': product,
-                'quantity': quantity,
-                'total': item_total
-            })
-            subtotal += item_total
-        except Product.DoesNotExist:
-            continue
-    
-    shipping_cost = Decimal('10.00')
-    tax = subtotal * Decimal('0.08')
-    
-    discount = Decimal('0')
+    # Charge what the checkout page showed, if it still holds
     applied_coupon = request.session.get('applied_coupon')
-    coupon_code = None
-    
-    if applied_coupon:
-        discount = Decimal(str(applied_coupon.get('discount', '0')))
-        coupon_code = applied_coupon.get('code')
-    
-    total = subtotal + shipping_cost + tax - discount
-    
-    # Create order
-    order = Order.objects.create(
-        user=request.user,
-        shipping_address=address,
-        shipping_full_name=address.full_name,
-        shipping_phone=address.phone,
-        shipping_street=address.street_address,
-        shipping_city=address.city,
-        shipping_state=address.state,
-        shipping_country=address.country,
-        shipping_postal_code=address.postal_code,
-        subtotal=subtotal,
-        shipping_cost=shipping_cost,
-        tax=tax,
-        discount=discount,
-        total_amount=total,
-        payment_method=payment_method,
-    )
-    
-    # Create order items
-    platform_fee_percent = Decimal('0.10')
+    try:
+        quote = Quote.from_token(request.POST.get('quote'), request.user)
+        products = quote.validate(cart, applied_coupon)
+    except QuoteError as exc:
+        messages.warning(request, str(exc))
+        return redirect('orders:checkout')
     
-    for item in cart_items:
-        product = item['product']
-        quantity = item['quantity']
-        item_subtotal = item['total']
-        
-        platform_fee = item_subtotal * platform_fee_percent
-        seller_amount = item_subtotal - platform_fee
-        
-        OrderItem.objects.create(
-            order=order,
-            product=product,
-            shop=product.shop,
-            product_name=product.name,
-            product_price=product.price,
-            quantity=quantity,
-            subtotal=item_subtotal,
-            seller_amount=seller_amount,
-            platform_fee=platform_fee
-        )
-        
-        # Update product stock
-        product.stock -= quantity
-        product.save()
+    try:
+        order = place_order(request.user, address, quote, products, payment_method)
+    except OutOfStock as exc:
+        messages.error(request, f'Sorry, not enough stock left for: {exc}. Please update your cart.')
+        return redirect('store:cart')
     
-    if coupon_code:
-        try:
-            coupon = Coupon.objects.get(code=coupon_code)
-            CouponUsage.objects.create(
-                coupon=coupon,
-                user=request.user,
-                order_number=order.order_number,
-                discount_amount=discount
-            )
-            coupon.times_used += 1
-            coupon.save()
-            
-            # Clear coupon from session
-            del request.session['applied_coupon']
-        except Coupon.DoesNotExist:
-            pass
+    if quote.coupon_code:
+        request.session.pop('applied_coupon', None)
     
     # Handle payment method
     if payment_method == 'cod':
-        order.status = 'processing'
-        order.save()
-        
         # Clear cart
-        request.session['cart'] = {}
+        cart.clear()
         messages.success(request, f'Order {order.order_number} placed successfully! Pay on delivery.')
         return redirect('orders:order_detail', order_number=order.order_number)
     
@@ -216,13 +111,54 @@ def create_order(request):
     return redirect('orders:order_detail', order_number=order.order_number)
 
 
+ORDERS_PER_PAGE = 20
+
+
+def _order_history(user):
+    """The user's orders with their unit count and first product image, in one query"""
+    items = OrderItem.objects.filter(order=OuterRef('pk')).order_by()
+    return Order.objects.filter(user=user).annotate(
+        item_count=Subquery(
+            items.values('order').annotate(units=Sum('quantity')).values('units'),
+            output_field=IntegerField(),
+        ),
+        thumbnail_name=Subquery(items.order_by('id').values('product__image')[:1]),
+    )
+
+
+def _thumbnail(order):
+    if not order.thumbnail_name:
+        return None
+    field = Product._meta.get_field('image')
+    return field.attr_class(None, field, order.thumbnail_name)
+
+
+def _order_payload(order):
+    return {
+        "order_number": order.order_number,
+        "created_at": order.created_at.isoformat(),
+        "total_amount": str(order.total_amount),
+        "status": order.status,
+        "payment_status": order.payment_status,
+        "item_count": order.item_count or 0,
+        "thumbnail": order.thumbnail.url if order.thumbnail else None,
+        "url": reverse('orders:order_detail', args=[order.order_number]),
+    }
+
+
 @login_required
 def order_list(request):
-    """List user's orders"""
-    orders = Order.objects.filter(user=request.user).prefetch_related('items')
+    """List user's orders, newest first, a page at a time"""
+    page = paginate(request, _order_history(request.user), '-created_at', ORDERS_PER_PAGE)
+    for order in page:
+        order.thumbnail = _thumbnail(order)
+    
+    if wants_json(request):
+        return JsonResponse(page.as_dict(_order_payload))
     
     context = {
-        'orders': orders
+        'orders': page,
+        'page': page,
     }
     return render(request, 'orders/order_list.html', context)
 
@@ -280,11 +216,12 @@ def cancel_order(request, order_number):
             order.status = 'cancelled'
             order.save()
             
-            # Restore product stock
-            for item in order.items.all():
-                if item.product:
-                    item.product.stock += item.quantity
-                    item.product.save()
+            if order.stock_holds.exists():
+                # Unpaid online order: give the held units back
+                release_holds(order.stock_holds.all())
+            else:
+                # Restore product stock
+                restock(order.items.values_list('product_id', 'quantity'), 'cancel', order)
             
             messages.success(request, f'Order {order_number} has been cancelled.')
         else:
@@ -1,11 +1,25 @@
 from django.contrib import admin
-from .models import Payment, SellerWallet, Earning, PayoutRequest
+from . import ledger, payouts
+from .models import Payment, CheckoutSnapshot, CheckoutLine, SellerWallet, Earning, PayoutBatch, PayoutRequest, WebhookEvent, LedgerEntry
 
 @admin.register(Payment)
 class PaymentAdmin(admin.ModelAdmin):
     list_display = ("order_id", "amount", "currency", "status", "created_at")
     search_fields = ("order_id", "stripe_session_id", "status")
 
+class CheckoutLineInline(admin.TabularInline):
+    model = CheckoutLine
+    extra = 0
+    can_delete = False
+    readonly_fields = ("product_id", "name", "unit_price", "quantity", "seller", "seller_amount", "platform_fee")
+
+@admin.register(CheckoutSnapshot)
+class CheckoutSnapshotAdmin(admin.ModelAdmin):
+    list_display = ("session_id", "user", "total", "currency", "created_at")
+    search_fields = ("session_id", "user__username")
+    readonly_fields = ("session_id", "user", "currency", "total", "created_at")
+    inlines = [CheckoutLineInline]
+
 @admin.register(SellerWallet)
 class SellerWalletAdmin(admin.ModelAdmin):
     list_display = ("seller", "balance", "total_earned", "total_withdrawn", "updated_at")
@@ -18,21 +32,34 @@ class EarningAdmin(admin.ModelAdmin):
 
 @admin.register(PayoutRequest)
 class PayoutRequestAdmin(admin.ModelAdmin):
-    list_display = ("seller", "amount", "status", "method", "created_at", "processed_at")
+    list_display = ("seller", "amount", "status", "method", "batch", "created_at", "processed_at")
     list_filter = ("status", "method")
-    actions = ["mark_paid", "approve", "reject"]
+    actions = ["pay_in_batch", "mark_paid", "approve", "reject"]
+
+    def pay_in_batch(self, request, queryset):
+        try:
+            batch = payouts.run(statuses=("pending", "approved"), payout_ids=queryset.values("pk"))
+        except payouts.SettlementBlocked as exc:
+            self.message_user(request, f"{exc}; it was left running for the next run.", level="warning")
+            return
+        if batch is None:
+            self.message_user(request, "None of the selected payouts could be paid.", level="warning")
+        else:
+            self.message_user(
+                request, f"Batch {batch.pk}: paid {batch.payout_count} payouts totalling {batch.total}."
+            )
+    pay_in_batch.short_description = "Pay selected payouts in a batch"
 
     def mark_paid(self, request, queryset):
+        from django.db import transaction
         from django.utils import timezone
         for payout in queryset.filter(status__in=["approved", "pending"]):
-            payout.status = "paid"
-            payout.processed_at = timezone.now()
-            payout.save()
-            # adjust wallet
-            wallet, _ = SellerWallet.objects.get_or_create(seller=payout.seller)
-            wallet.balance = wallet.balance - payout.amount
-            wallet.total_withdrawn = wallet.total_withdrawn + payout.amount
-            wallet.save()
+            with transaction.atomic():
+                payout.status = "paid"
+                payout.processed_at = timezone.now()
+                payout.save()
+                # adjust wallet
+                ledger.post_payout(payout)
     mark_paid.short_description = "Mark selected payouts as paid"
 
     def approve(self, request, queryset):
@@ -42,3 +69,28 @@ class PayoutRequestAdmin(admin.ModelAdmin):
     def reject(self, request, queryset):
         queryset.update(status="rejected")
     reject.short_description = "Reject selected payouts"
+
+@admin.register(PayoutBatch)
+class PayoutBatchAdmin(admin.ModelAdmin):
+    list_display = ("id", "status", "payout_count", "total", "created_at", "settled_at")
+    list_filter = ("status",)
+    readonly_fields = ("status", "payout_count", "total", "settlement_file", "created_at", "settled_at")
+
+@admin.register(LedgerEntry)
+class LedgerEntryAdmin(admin.ModelAdmin):
+    list_display = ("created_at", "account", "seller", "amount", "kind", "reference", "transaction_id")
+    list_filter = ("account", "kind")
+    search_fields = ("reference", "transaction_id", "seller__username")
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+@admin.register(WebhookEvent)
+class WebhookEventAdmin(admin.ModelAdmin):
+    list_display = ("event_id", "type", "received_at", "processed_at", "attempts", "next_attempt_at")
+    list_filter = ("provider", "type")
+    search_fields = ("event_id",)
+    readonly_fields = ("provider", "event_id", "type", "payload", "received_at")
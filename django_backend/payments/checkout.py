@@ -0,0 +1,70 @@
+"""
+Checkout snapshots.
+
+``create_checkout_session`` stores the cart it charges for as a
+``CheckoutSnapshot`` keyed by the Stripe session id, one ``CheckoutLine``
+per cart line with the seller's share and the platform fee already
+worked out. When the session completes, the webhook handler reads the
+lines back with one indexed lookup (``earning_lines``) instead of parsing
+the cart out of the session's metadata, which Stripe limits to 500
+characters per value.
+"""
+import json
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import CheckoutLine, CheckoutSnapshot
+
+CENT = Decimal("0.01")
+
+
+def fee_rate():
+    return Decimal(str(getattr(settings, "PLATFORM_FEE_PERCENT", 10))) / Decimal("100")
+
+
+def split(price, quantity, rate=None):
+    """``(seller amount, platform fee)`` for ``quantity`` units at ``price``."""
+    gross = (Decimal(str(price)) * quantity).quantize(CENT)
+    fee = (gross * (fee_rate() if rate is None else rate)).quantize(CENT)
+    return gross - fee, fee
+
+
+def save_snapshot(session_id, user, items, currency="usd"):
+    """Store ``items`` (``id, name, price, quantity, seller_id`` dicts) for ``session_id``."""
+    rate = fee_rate()
+    with transaction.atomic():
+        snapshot = CheckoutSnapshot.objects.create(
+            session_id=session_id,
+            user=user,
+            currency=currency,
+            total=sum((Decimal(str(it["price"])) * it["quantity"] for it in items), Decimal("0")),
+        )
+        lines = []
+        for it in items:
+            seller_amount, fee = split(it["price"], it["quantity"], rate)
+            lines.append(CheckoutLine(
+                snapshot=snapshot, product_id=str(it["id"]), name=it["name"][:255],
+                unit_price=it["price"], quantity=it["quantity"], seller_id=it["seller_id"],
+                seller_amount=seller_amount, platform_fee=fee,
+            ))
+        CheckoutLine.objects.bulk_create(lines)
+    return snapshot
+
+
+def earning_lines(session):
+    """``(seller id, product id, amount, fee)`` for each line of a Checkout Session, for ``ledger.post_earnings``."""
+    lines = list(
+        CheckoutLine.objects.filter(snapshot__session_id=session["id"])
+        .order_by("pk")
+        .values_list("seller_id", "product_id", "seller_amount", "platform_fee")
+    )
+    if lines:
+        return lines
+    # Sessions created before snapshots carry their cart in the metadata
+    cart_items = json.loads((session.get("metadata") or {}).get("cart_json", "[]"))
+    return [
+        (it.get("seller_id"), str(it.get("id")), *split(it.get("price", "0"), Decimal(str(it.get("quantity", 1)))))
+        for it in cart_items
+    ]
@@ -0,0 +1,167 @@
+"""
+Double-entry seller ledger.
+
+Money moves as balanced transactions of ``LedgerEntry`` legs: a paid order
+debits ``sales`` by its gross and credits each seller their share and
+``platform`` the fee; a payout debits the seller and credits ``payouts``.
+``post`` writes all legs of a transaction with one ``bulk_create`` and
+moves each seller's ``SellerWallet`` with one ``F()`` update per seller,
+in the same transaction. Wallets therefore stay correct when payments
+for the same seller are posted concurrently, and reading a balance costs
+one row.
+
+Wallets that existed before the ledger were opened with ``kind="opening"``
+entries by migration 0003. ``wallet_drift`` compares wallets with the
+ledger; ``manage.py reconcile_wallets`` reports drift, opens wallets that
+still have no opening entry, and can reset wallets to their ledger balance.
+"""
+import uuid
+from collections import Counter, namedtuple
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import DecimalField, Exists, F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Earning, LedgerEntry, SellerWallet
+
+ZERO = Decimal("0.00")
+
+Leg = namedtuple("Leg", "account amount seller_id", defaults=(None,))
+
+
+class UnbalancedTransaction(ValueError):
+    pass
+
+
+def post(legs, kind, reference=""):
+    """Write one balanced transaction and move the sellers' wallets; returns its id."""
+    legs = [leg for leg in legs if leg.amount]
+    if sum((leg.amount for leg in legs), ZERO) != ZERO:
+        raise UnbalancedTransaction(f"{kind} {reference} does not balance")
+    transaction_id = uuid.uuid4()
+    sellers = Counter()
+    for leg in legs:
+        if leg.account == "seller":
+            sellers[leg.seller_id] += leg.amount
+    with transaction.atomic():
+        LedgerEntry.objects.bulk_create([
+            LedgerEntry(
+                transaction_id=transaction_id, account=leg.account, seller_id=leg.seller_id,
+                amount=leg.amount, kind=kind, reference=reference,
+            )
+            for leg in legs
+        ])
+        _move_wallets(sellers, kind)
+    return transaction_id
+
+
+def _move_wallets(sellers, kind):
+    if not sellers:
+        return
+    SellerWallet.objects.bulk_create(
+        [SellerWallet(seller_id=seller_id) for seller_id in sellers], ignore_conflicts=True
+    )
+    # Fixed order so concurrent postings cannot deadlock
+    for seller_id, amount in sorted(sellers.items()):
+        changes = {"balance": F("balance") + amount, "updated_at": timezone.now()}
+        if kind == "earning":
+            changes["total_earned"] = F("total_earned") + amount
+        elif kind == "payout":
+            changes["total_withdrawn"] = F("total_withdrawn") - amount
+        SellerWallet.objects.filter(seller_id=seller_id).update(**changes)
+
+
+def post_earnings(order_id, lines):
+    """
+    Credit sellers for a paid order; ``lines`` are ``(seller id, order item id, amount, fee)``.
+
+    Writes one ``Earning`` per line and one ledger transaction for the order.
+    """
+    lines = [line for line in lines if line[0]]
+    if not lines:
+        return None
+    with transaction.atomic():
+        Earning.objects.bulk_create([
+            Earning(seller_id=seller_id, order_id=order_id, order_item_id=item_id, amount=amount, platform_fee=fee)
+            for seller_id, item_id, amount, fee in lines
+        ])
+        legs = [Leg("seller", amount, seller_id) for seller_id, _, amount, _ in lines]
+        fees = sum((fee for _, _, _, fee in lines), ZERO)
+        legs.append(Leg("platform", fees))
+        legs.append(Leg("sales", -sum((leg.amount for leg in legs), ZERO)))
+        return post(legs, "earning", order_id)
+
+
+def post_payout(payout):
+    """Move a paid ``PayoutRequest`` out of the seller's balance."""
+    return post(
+        [Leg("seller", -payout.amount, payout.seller_id), Leg("payouts", payout.amount)],
+        "payout", str(payout.pk),
+    )
+
+
+def seller_balance(seller_id):
+    """The seller's balance summed from the ledger (the wallet holds the same, in O(1))."""
+    total = LedgerEntry.objects.filter(account="seller", seller_id=seller_id).aggregate(total=Sum("amount"))["total"]
+    return total or ZERO
+
+
+def _ledger_balance():
+    return Coalesce(
+        Subquery(
+            LedgerEntry.objects.filter(account="seller", seller=OuterRef("seller"))
+            .order_by()
+            .values("seller")
+            .annotate(total=Sum("amount"))
+            .values("total"),
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        ),
+        ZERO,
+    )
+
+
+def wallet_drift():
+    """Wallets whose balance differs from their ledger balance, annotated with ``ledger``."""
+    return SellerWallet.objects.annotate(ledger=_ledger_balance()).exclude(balance=F("ledger")).order_by("seller_id")
+
+
+def _opened():
+    return LedgerEntry.objects.filter(account="seller", kind="opening", seller=OuterRef("seller"))
+
+
+def open_balances():
+    """
+    Write an opening transaction for each wallet that has none, for what its
+    balance holds beyond its ledger entries (money earned before the ledger).
+    """
+    opened = 0
+    wallets = SellerWallet.objects.exclude(Exists(_opened())).annotate(ledger=_ledger_balance())
+    for wallet in wallets.iterator():
+        # The wallet already holds this balance, so only the ledger is written
+        amount = wallet.balance - wallet.ledger
+        transaction_id = uuid.uuid4()
+        LedgerEntry.objects.bulk_create([
+            LedgerEntry(
+                transaction_id=transaction_id, account="seller", seller_id=wallet.seller_id,
+                amount=amount, kind="opening", reference=str(wallet.pk),
+            ),
+            LedgerEntry(
+                transaction_id=transaction_id, account="opening",
+                amount=-amount, kind="opening", reference=str(wallet.pk),
+            ),
+        ])
+        opened += 1
+    return opened
+
+
+def reset_wallets():
+    """
+    Set drifted wallet balances to their ledger balance; returns how many changed.
+
+    A wallet without an opening entry may hold money from before the ledger,
+    so it is only ever raised, never lowered; ``open_balances`` it first.
+    """
+    drifted = wallet_drift().filter(Q(Exists(_opened())) | Q(balance__lt=F("ledger")))
+    return SellerWallet.objects.filter(pk__in=drifted.values("pk")).update(balance=_ledger_balance())
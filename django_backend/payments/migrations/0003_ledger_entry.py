@@ -0,0 +1,61 @@
+# Generated by Django 5.2 on 2026-10-18 10:08
+
+import uuid
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+BATCH_SIZE = 500
+
+
+def open_ledger(apps, schema_editor):
+    """Bring every existing wallet's balance into the ledger before anything is posted to it."""
+    SellerWallet = apps.get_model('payments', 'SellerWallet')
+    LedgerEntry = apps.get_model('payments', 'LedgerEntry')
+    entries = []
+    for wallet in SellerWallet.objects.order_by('pk').iterator(chunk_size=BATCH_SIZE):
+        transaction_id = uuid.uuid4()
+        entries += [
+            LedgerEntry(
+                transaction_id=transaction_id, account='seller', seller_id=wallet.seller_id,
+                amount=wallet.balance, kind='opening', reference=str(wallet.pk),
+            ),
+            LedgerEntry(
+                transaction_id=transaction_id, account='opening',
+                amount=-wallet.balance, kind='opening', reference=str(wallet.pk),
+            ),
+        ]
+        if len(entries) >= BATCH_SIZE:
+            LedgerEntry.objects.bulk_create(entries)
+            entries = []
+    LedgerEntry.objects.bulk_create(entries)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0002_webhook_event'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('transaction_id', models.UUIDField(db_index=True)),
+                ('account', models.CharField(choices=[('seller', 'Seller'), ('platform', 'Platform fees'), ('sales', 'Sales clearing'), ('payouts', 'Payouts'), ('opening', 'Opening balances')], max_length=16)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('kind', models.CharField(choices=[('earning', 'Earning'), ('payout', 'Payout'), ('opening', 'Opening balance'), ('adjustment', 'Adjustment')], max_length=16)),
+                ('reference', models.CharField(blank=True, max_length=64)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('seller', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='ledger_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['seller', 'created_at'], name='payments_ledger_seller_idx'), models.Index(fields=['account', 'created_at'], name='payments_ledger_account_idx')],
+            },
+        ),
+        migrations.RunPython(open_ledger, migrations.RunPython.noop),
+    ]
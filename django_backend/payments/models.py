@@ -16,6 +16,31 @@ class Payment(models.Model):
     def __str__(self):
         return f"Payment {self.order_id} - {self.status}"
 
+class CheckoutSnapshot(models.Model):
+    """The cart a Stripe Checkout Session was created for (see payments.checkout)."""
+    session_id = models.CharField(max_length=255, unique=True)
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name="checkout_snapshots")
+    currency = models.CharField(max_length=8, default="usd")
+    total = models.DecimalField(max_digits=12, decimal_places=2)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"CheckoutSnapshot {self.session_id}"
+
+class CheckoutLine(models.Model):
+    """One cart line of a ``CheckoutSnapshot``, with the seller's share and platform fee fixed at checkout."""
+    snapshot = models.ForeignKey(CheckoutSnapshot, on_delete=models.CASCADE, related_name="lines")
+    product_id = models.CharField(max_length=64)
+    name = models.CharField(max_length=255)
+    unit_price = models.DecimalField(max_digits=12, decimal_places=2)
+    quantity = models.PositiveIntegerField()
+    seller = models.ForeignKey(User, on_delete=models.PROTECT, null=True, blank=True, related_name="+")
+    seller_amount = models.DecimalField(max_digits=12, decimal_places=2)
+    platform_fee = models.DecimalField(max_digits=12, decimal_places=2)
+
+    def __str__(self):
+        return f"{self.quantity} x {self.name}"
+
 class SellerWallet(models.Model):
     seller = models.OneToOneField(User, on_delete=models.CASCADE, related_name="wallet")
     balance = models.DecimalField(max_digits=12, decimal_places=2, default=0)
@@ -37,6 +62,22 @@ class Earning(models.Model):
     def __str__(self):
         return f"Earning seller={self.seller_id} order={self.order_id} amount={self.amount}"
 
+class PayoutBatch(models.Model):
+    """One run of the payout engine and its settlement file (see payments.payouts)."""
+    STATUS_CHOICES = [
+        ("running", "Running"),
+        ("settled", "Settled"),
+    ]
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default="running")
+    payout_count = models.PositiveIntegerField(default=0)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    settlement_file = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    settled_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"PayoutBatch({self.pk}, {self.status}, {self.payout_count} payouts)"
+
 class PayoutRequest(models.Model):
     STATUS_CHOICES = [
         ("pending", "Pending"),
@@ -51,6 +92,78 @@ class PayoutRequest(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     processed_at = models.DateTimeField(null=True, blank=True)
     method = models.CharField(max_length=32, default="manual")  # manual | stripe
+    batch = models.ForeignKey(PayoutBatch, on_delete=models.PROTECT, null=True, blank=True, related_name="payouts")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "id"], name="payments_payout_status_idx"),
+        ]
 
     def __str__(self):
         return f"PayoutRequest({self.seller_id}, {self.amount}, {self.status})"
+
+class WebhookEvent(models.Model):
+    """A provider webhook delivery, stored on receipt and processed later (see payments.webhooks)."""
+    provider = models.CharField(max_length=16, default="stripe")
+    event_id = models.CharField(max_length=255)
+    type = models.CharField(max_length=100)
+    payload = models.JSONField()
+    received_at = models.DateTimeField(default=timezone.now)
+
+    # Worker bookkeeping
+    processed_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["provider", "event_id"], name="payments_webhook_event_unique"),
+        ]
+        indexes = [
+            models.Index(
+                fields=["next_attempt_at"], name="payments_webhook_due_idx",
+                condition=models.Q(processed_at__isnull=True),
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.provider} {self.type} {self.event_id}"
+
+class LedgerEntry(models.Model):
+    """
+    One leg of a balanced ledger transaction (see payments.ledger).
+
+    A positive amount credits the account, a negative one debits it; the
+    legs sharing a ``transaction_id`` sum to zero. Seller legs also move
+    the seller's ``SellerWallet``, which is their running balance.
+    """
+    ACCOUNT_CHOICES = [
+        ("seller", "Seller"),
+        ("platform", "Platform fees"),
+        ("sales", "Sales clearing"),
+        ("payouts", "Payouts"),
+        ("opening", "Opening balances"),
+    ]
+    KIND_CHOICES = [
+        ("earning", "Earning"),
+        ("payout", "Payout"),
+        ("opening", "Opening balance"),
+        ("adjustment", "Adjustment"),
+    ]
+    transaction_id = models.UUIDField(db_index=True)
+    account = models.CharField(max_length=16, choices=ACCOUNT_CHOICES)
+    seller = models.ForeignKey(User, on_delete=models.PROTECT, null=True, blank=True, related_name="ledger_entries")
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES)
+    reference = models.CharField(max_length=64, blank=True)  # order id, payout id, ...
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["seller", "created_at"], name="payments_ledger_seller_idx"),
+            models.Index(fields=["account", "created_at"], name="payments_ledger_account_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.account} {self.amount} ({self.kind} {self.reference})"
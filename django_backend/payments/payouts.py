@@ -0,0 +1,160 @@
+"""
+Batched payouts.
+
+``run`` pays approved ``PayoutRequest`` rows in chunks. Each chunk is one
+transaction: it locks the requests and their sellers' wallets with
+``select_for_update(skip_locked=True)``, so anything another run or an
+admin is touching is left for the next run. It checks each request
+against what is left of the seller's balance, rejects the ones that no
+longer fit, marks the rest paid in the batch with one ``bulk_update``, and
+debits the sellers through one ledger transaction (``payments.ledger``).
+Only one chunk is in memory at a time.
+
+Once every chunk is done the batch's settlement CSV is written from the
+database into ``PAYOUT_SETTLEMENT_DIR``. A run that crashes leaves its
+batch ``running``; the next run resumes that batch. Chunks already
+committed stay paid, and the file is written from the database at the
+end, so it is complete.
+
+Settling locks the batch row, and every chunk locks it too and stops if
+the batch has been settled, so no payout can join a batch while its file
+is written. A batch that still has payouts which are not paid, or which
+someone else holds locked, is not settled (``SettlementBlocked``); it stays
+``running`` for the next run.
+"""
+import csv
+import os
+from decimal import Decimal
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from . import ledger
+from .models import PayoutBatch, PayoutRequest, SellerWallet
+
+CHUNK_SIZE = 500
+SETTLEMENT_COLUMNS = ["payout_id", "seller_id", "username", "email", "amount", "method", "processed_at"]
+
+
+class SettlementBlocked(Exception):
+    """The batch has payouts in flight; it stays running and a later run settles it."""
+
+
+def run(chunk_size=CHUNK_SIZE, statuses=("approved",), payout_ids=None):
+    """Pay every due request in one batch; returns the settled batch, or ``None`` if nothing was paid."""
+    due = PayoutRequest.objects.filter(status__in=statuses, batch__isnull=True)
+    if payout_ids is not None:
+        due = due.filter(pk__in=payout_ids)
+
+    batch = PayoutBatch.objects.filter(status="running").order_by("pk").first() or PayoutBatch.objects.create()
+    last_id = 0
+    while True:
+        ids = list(due.filter(pk__gt=last_id).order_by("pk").values_list("pk", flat=True)[:chunk_size])
+        if not ids:
+            break
+        last_id = ids[-1]
+        _pay_chunk(batch, due.filter(pk__in=ids))
+    return settle(batch)
+
+
+def _pay_chunk(batch, payouts):
+    with transaction.atomic():
+        # Waits for a settle in progress; a settled batch takes no more payouts
+        if not PayoutBatch.objects.select_for_update().filter(pk=batch.pk, status="running").exists():
+            return 0
+        payouts = list(payouts.select_for_update(skip_locked=True).order_by("pk"))
+        seller_ids = {payout.seller_id for payout in payouts}
+        balances = dict(
+            SellerWallet.objects.select_for_update(skip_locked=True)
+            .filter(seller_id__in=seller_ids)
+            .order_by("seller_id")
+            .values_list("seller_id", "balance")
+        )
+        locked_elsewhere = set(
+            SellerWallet.objects.filter(seller_id__in=seller_ids - balances.keys()).values_list("seller_id", flat=True)
+        )
+
+        now = timezone.now()
+        paid, rejected = [], []
+        for payout in payouts:
+            if payout.seller_id in locked_elsewhere:
+                # Next run
+                continue
+            balance = balances.get(payout.seller_id, Decimal("0"))
+            if payout.amount <= 0 or payout.amount > balance:
+                payout.status = "rejected"
+                payout.notes = f"{payout.notes}\nRejected by payout batch {batch.pk}: insufficient balance".strip()
+                rejected.append(payout)
+                continue
+            balances[payout.seller_id] = balance - payout.amount
+            payout.status = "paid"
+            payout.batch = batch
+            paid.append(payout)
+
+        for payout in paid + rejected:
+            payout.processed_at = now
+        PayoutRequest.objects.bulk_update(paid + rejected, ["status", "notes", "batch", "processed_at"])
+        if paid:
+            legs = [ledger.Leg("seller", -payout.amount, payout.seller_id) for payout in paid]
+            legs.append(ledger.Leg("payouts", sum((payout.amount for payout in paid), Decimal("0"))))
+            ledger.post(legs, "payout", f"batch:{batch.pk}")
+    return len(paid)
+
+
+def settlement_path(batch):
+    return Path(getattr(settings, "PAYOUT_SETTLEMENT_DIR", Path(settings.BASE_DIR) / "settlements")) / (
+        f"payout-batch-{batch.pk}.csv"
+    )
+
+
+def settle(batch):
+    """
+    Write the batch's settlement file and close it; an empty batch is deleted instead.
+
+    Raises ``SettlementBlocked`` while any of its payouts is not paid or is
+    locked by another transaction.
+    """
+    with transaction.atomic():
+        batch = PayoutBatch.objects.select_for_update().filter(pk=batch.pk).first()
+        if batch is None or batch.status == "settled":
+            # Deleted as empty, or settled, by a concurrent run
+            return batch
+        totals = batch.payouts.aggregate(count=Count("pk"), total=Sum("amount"))
+        if not totals["count"]:
+            batch.delete()
+            return None
+        unpaid = batch.payouts.exclude(status="paid").count()
+        if unpaid:
+            raise SettlementBlocked(f"Batch {batch.pk} has {unpaid} payouts that are not paid")
+        free = len(batch.payouts.select_for_update(skip_locked=True).values_list("pk", flat=True))
+        if free < totals["count"]:
+            raise SettlementBlocked(f"Batch {batch.pk} has {totals['count'] - free} payouts locked elsewhere")
+        return _write_settlement(batch, totals)
+
+
+def _write_settlement(batch, totals):
+    path = settlement_path(batch)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_suffix(".csv.part")
+    with open(partial, "w", newline="") as handle:
+        writer = csv.writer(handle)
+        writer.writerow(SETTLEMENT_COLUMNS)
+        rows = (
+            batch.payouts.order_by("pk")
+            .values_list("pk", "seller_id", "seller__username", "seller__email", "amount", "method", "processed_at")
+            .iterator(chunk_size=CHUNK_SIZE)
+        )
+        for pk, seller_id, username, email, amount, method, processed_at in rows:
+            writer.writerow([pk, seller_id, username, email, f"{amount:.2f}", method, processed_at.isoformat()])
+    os.replace(partial, path)
+
+    batch.status = "settled"
+    batch.payout_count = totals["count"]
+    batch.total = totals["total"]
+    batch.settlement_file = str(path)
+    batch.settled_at = timezone.now()
+    batch.save(update_fields=["status", "payout_count", "total", "settlement_file", "settled_at"])
+    return batch
@@ -0,0 +1,169 @@
+"""
+Stripe webhook inbox.
+
+``stripe_webhook`` only checks the ``Stripe-Signature`` header and stores
+the event as a ``WebhookEvent`` keyed by its Stripe id, then answers 200;
+a redelivered event hits the unique key and is dropped. The work happens
+in ``manage.py process_webhook_events``: each due event runs its
+``@handles(type)`` handlers in one transaction with marking it processed,
+and a failure is retried with exponential backoff up to ``MAX_ATTEMPTS``
+times.
+
+``fake_event`` and ``signature_header`` build signed deliveries for local
+testing (``manage.py fake_stripe_event``).
+"""
+import hashlib
+import hmac
+import json
+import logging
+import time
+import uuid
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from . import checkout, ledger
+from .models import Payment, WebhookEvent
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 100
+MAX_ATTEMPTS = 8
+BACKOFF_BASE = 30  # seconds; doubles with each failed attempt
+BACKOFF_MAX = 6 * 60 * 60
+SIGNATURE_TOLERANCE = 5 * 60
+
+_handlers = defaultdict(list)
+
+
+class InvalidSignature(Exception):
+    pass
+
+
+def handles(*types):
+    """Register a handler, called with the ``WebhookEvent``, for Stripe event ``types``."""
+    def register(func):
+        for event_type in types:
+            _handlers[event_type].append(func)
+        return func
+    return register
+
+
+# -------------------- Receiving --------------------
+
+def _sign(payload, secret, timestamp):
+    message = f"{timestamp}.".encode() + payload
+    return hmac.new(secret.encode(), message, hashlib.sha256).hexdigest()
+
+
+def verify_signature(payload, header, secret, tolerance=SIGNATURE_TOLERANCE, now=None):
+    """Check a ``Stripe-Signature`` header (``t=...,v1=...``) against the raw ``payload`` bytes."""
+    if not secret:
+        raise InvalidSignature("STRIPE_WEBHOOK_SECRET is not set")
+    parts = defaultdict(list)
+    for item in (header or "").split(","):
+        name, _, value = item.strip().partition("=")
+        parts[name].append(value)
+    try:
+        timestamp = int(parts["t"][0])
+    except (IndexError, ValueError):
+        raise InvalidSignature("No timestamp in signature header")
+    expected = _sign(payload, secret, timestamp)
+    if not any(hmac.compare_digest(expected, candidate) for candidate in parts["v1"]):
+        raise InvalidSignature("No matching signature")
+    if abs((now or time.time()) - timestamp) > tolerance:
+        raise InvalidSignature("Timestamp outside the tolerance zone")
+
+
+def receive(payload, header):
+    """Verify and store one delivery; returns ``False`` for a redelivered event."""
+    verify_signature(payload, header, settings.STRIPE_WEBHOOK_SECRET)
+    try:
+        event = json.loads(payload)
+        event_id, event_type = event["id"], event["type"]
+    except (ValueError, KeyError, TypeError):
+        raise InvalidSignature("Malformed event")
+    try:
+        with transaction.atomic():
+            WebhookEvent.objects.create(provider="stripe", event_id=event_id, type=event_type, payload=event)
+    except IntegrityError:
+        return False
+    return True
+
+
+# -------------------- Processing --------------------
+
+def backoff(attempts):
+    return timedelta(seconds=min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX))
+
+
+def process_due(batch_size=BATCH_SIZE, now=None):
+    """Handle one batch of due events; returns how many were processed."""
+    now = now or timezone.now()
+    ids = list(
+        WebhookEvent.objects.filter(processed_at__isnull=True, attempts__lt=MAX_ATTEMPTS, next_attempt_at__lte=now)
+        .order_by("next_attempt_at", "id")
+        .values_list("pk", flat=True)[:batch_size]
+    )
+    processed = 0
+    for pk in ids:
+        try:
+            with transaction.atomic():
+                event = (
+                    WebhookEvent.objects.select_for_update(skip_locked=True)
+                    .filter(pk=pk, processed_at__isnull=True)
+                    .first()
+                )
+                if event is None:
+                    # Another worker has it
+                    continue
+                for handler in _handlers.get(event.type, ()):
+                    handler(event)
+                event.processed_at = timezone.now()
+                event.save(update_fields=["processed_at"])
+            processed += 1
+        except Exception as exc:
+            logger.exception("Webhook event %s failed", pk)
+            event = WebhookEvent.objects.get(pk=pk)
+            event.attempts += 1
+            event.next_attempt_at = timezone.now() + backoff(event.attempts)
+            event.last_error = str(exc)[:1000]
+            event.save(update_fields=["attempts", "next_attempt_at", "last_error"])
+    return processed
+
+
+@handles("checkout.session.completed")
+def checkout_session_completed(event):
+    """Mark the session's payment paid and credit each seller for their items"""
+    session = event.payload["data"]["object"]
+    payment = Payment.objects.select_for_update().filter(stripe_session_id=session["id"]).first()
+    if payment is None or payment.status == "paid":
+        return
+
+    payment.status = "paid"
+    payment.save(update_fields=["status"])
+
+    ledger.post_earnings(payment.order_id, checkout.earning_lines(session))
+
+
+# -------------------- Local testing --------------------
+
+def fake_event(event_type, obj, event_id=None):
+    """A Stripe-shaped event dict wrapping ``obj``."""
+    return {
+        "id": event_id or f"evt_{uuid.uuid4().hex[:24]}",
+        "object": "event",
+        "type": event_type,
+        "created": int(time.time()),
+        "livemode": False,
+        "data": {"object": obj},
+    }
+
+
+def signature_header(payload, secret=None, timestamp=None):
+    """``Stripe-Signature`` value for raw ``payload`` bytes, as Stripe would send it."""
+    timestamp = int(timestamp or time.time())
+    return f"t={timestamp},v1={_sign(payload, secret or settings.STRIPE_WEBHOOK_SECRET, timestamp)}"
@@ -0,0 +1,121 @@
+"""
+Sale prices from running promotions.
+
+``discount_map()`` holds the best running discount for every product, by
+product and by category, built from ``Event.products`` and
+``Event.categories`` in three queries. The map only changes when an event
+starts or ends, so it is cached until the next such boundary; event edits
+bump ``PROMOTIONS_VERSION_KEY`` (see ``promotions.signals``) to drop it early.
+
+``apply_prices(products)`` sets ``sale_price``/``sale_event_id`` on a batch of
+``Product`` instances with a dict lookup each; ``Product.current_price``
+then returns what the customer pays.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from store.cache import bump_version, get_version
+from .models import Event
+
+PROMOTIONS_VERSION_KEY = "promotions:version"
+CENT = Decimal('0.01')
+
+
+def best_event(events):
+    """Highest discount wins; the older event breaks ties."""
+    return max(events, key=lambda event: (event.discount_percentage, -event.pk))
+
+
+def discounted(price, percentage):
+    return (price - price * percentage / Decimal('100')).quantize(CENT)
+
+
+class DiscountMap:
+    """Best running ``(discount percentage, event id)`` per product and per category."""
+
+    def __init__(self, by_product, by_category, valid_until):
+        self.by_product = by_product
+        self.by_category = by_category
+        self.valid_until = valid_until
+
+    @classmethod
+    def build(cls, now=None):
+        now = now or timezone.now()
+        events = Event.objects.filter(is_active=True, end_date__gt=now).in_bulk()
+        running = {pk: event for pk, event in events.items() if event.start_date <= now}
+        boundaries = [event.end_date for event in running.values()]
+        boundaries += [event.start_date for event in events.values() if event.start_date > now]
+
+        by_product, by_category = {}, {}
+        for target, through, column in (
+            (by_product, Event.products.through, 'product_id'),
+            (by_category, Event.categories.through, 'category_id'),
+        ):
+            for key, event_id in through.objects.filter(event_id__in=running).values_list(column, 'event_id'):
+                target.setdefault(key, []).append(running[event_id])
+        return cls(
+            {key: cls._best(events) for key, events in by_product.items()},
+            {key: cls._best(events) for key, events in by_category.items()},
+            min(boundaries) if boundaries else None,
+        )
+
+    @staticmethod
+    def _best(events):
+        event = best_event(events)
+        return event.discount_percentage, event.pk
+
+    def lookup(self, product_id, category_id):
+        """``(percentage, event id)`` for one product, or ``None``."""
+        candidates = [self.by_product.get(product_id), self.by_category.get(category_id)]
+        candidates = [candidate for candidate in candidates if candidate]
+        if not candidates:
+            return None
+        return max(candidates, key=lambda candidate: (candidate[0], -candidate[1]))
+
+    def price(self, product_id, category_id, price):
+        """``(sale price, event id)``, or ``(None, None)`` when nothing runs."""
+        best = self.lookup(product_id, category_id)
+        if best is None:
+            return None, None
+        return discounted(price, best[0]), best[1]
+
+    def is_current(self, now):
+        return self.valid_until is None or now < self.valid_until
+
+
+def promotions_version():
+    return get_version(PROMOTIONS_VERSION_KEY)
+
+
+def bump_promotions_version():
+    bump_version(PROMOTIONS_VERSION_KEY)
+
+
+def discount_map():
+    """The cached ``DiscountMap``, rebuilt once the next event boundary passes."""
+    key = f"promotions:discounts:{promotions_version()}"
+    now = timezone.now()
+    discounts = cache.get(key)
+    if discounts is None or not discounts.is_current(now):
+        discounts = DiscountMap.build(now)
+        timeout = getattr(settings, 'PROMOTION_PRICES_TIMEOUT', 60 * 60)
+        if discounts.valid_until is not None:
+            # Whole seconds, rounded up; is_current() catches the remainder.
+            until = discounts.valid_until - now + timedelta(seconds=1)
+            timeout = min(timeout, int(until.total_seconds()))
+        cache.set(key, discounts, timeout)
+    return discounts
+
+
+def apply_prices(products, discounts=None):
+    """Set ``sale_price`` and ``sale_event_id`` on each product; returns ``products``."""
+    discounts = discounts or discount_map()
+    for product in products:
+        product.sale_price, product.sale_event_id = discounts.price(
+            product.pk, product.category_id, product.price
+        )
+    return products
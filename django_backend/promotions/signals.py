@@ -0,0 +1,31 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from store import cards
+from store.cache import bump_catalog_version
+from store.models import Product
+from .models import Event
+from .pricing import bump_promotions_version
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+def reprice_event_cards(sender, instance, **kwargs):
+    """Sale prices on product cards and in the discount map follow the event"""
+    cards.refresh_event_cards(instance)
+    bump_promotions_version()
+    bump_catalog_version()
+
+
+@receiver(m2m_changed, sender=Event.products.through)
+@receiver(m2m_changed, sender=Event.categories.through)
+def reprice_event_membership(sender, instance, action, reverse, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        cards.refresh_event_cards(instance)
+    elif isinstance(instance, Product):
+        cards.refresh_card(instance)
+    else:
+        cards.refresh_cards(Product.objects.filter(category=instance).values_list('pk', flat=True))
+    bump_promotions_version()
+    bump_catalog_version()
@@ -3,8 +3,12 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.http import JsonResponse
 from django.utils import timezone
+from django.db.models import Q
 from .models import Event, Coupon, CouponUsage
+from .pricing import apply_prices, discounted
+from store.cart import Cart
 from store.models import Product
+from store.pagination import paginate
 from decimal import Decimal
 
 
@@ -32,26 +36,28 @@ def event_detail(request, slug):
     """Event detail page with discounted products"""
     event = get_object_or_404(Event, slug=slug, is_active=True)
     
-    # Get products in this event
-    products = event.products.filter(is_active=True)
-    
-    # Also get products from categories in this event
-    category_products = Product.objects.filter(
-        category__in=event.categories.all(),
+    # Products attached directly or through one of the event's categories
+    products = Product.objects.filter(
+        Q(id__in=event.products.values('id')) | Q(category__in=event.categories.all()),
         is_active=True
-    ).exclude(id__in=products.values_list('id', flat=True))
-    
-    all_products = list(products) + list(category_products)
+    )
+    page = paginate(request, products, '-created_at')
     
-    # Calculate discounted prices
-    for product in all_products:
+    # Running events price through the shared discount map, which may hold a
+    # better offer than this one; upcoming events show a preview price.
+    apply_prices(page)
+    for product in page:
         product.original_price = product.price
-        product.discounted_price = event.get_discounted_price(product.price)
+        if event.is_ongoing:
+            product.discounted_price = product.current_price
+        else:
+            product.discounted_price = discounted(product.price, event.discount_percentage)
         product.savings = product.original_price - product.discounted_price
     
     context = {
         'event': event,
-        'products': all_products,
+        'products': page,
+        'page': page,
     }
     return render(request, 'promotions/event_detail.html', context)
 
@@ -71,13 +77,7 @@ def apply_coupon(request):
             return JsonResponse({'success': False, 'message': 'Invalid coupon code'})
         
         # Calculate cart total
-        cart = request.session.get('cart', {})
-        cart_total = Decimal('0')
-        
-        for product_id, item_data in cart.items():
-            price = Decimal(str(item_data.get('price', '0')))
-            qty = int(item_data.get('qty', 1))
-            cart_total += price * qty
+        cart_total = Cart(request).subtotal
         
         # Check if coupon can be used
         can_use, message = coupon.can_use(request.user, cart_total)
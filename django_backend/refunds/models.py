@@ -1,7 +1,9 @@
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 from accounts.models import CustomUser
+from orders import events
 from orders.models import Order, OrderItem
+from store.inventory import restock
 from decimal import Decimal
 
 
@@ -141,6 +143,7 @@ class Refund(models.Model):
             self.refund_number = f"RFD{uuid.uuid4().hex[:8].upper()}"
         super().save(*args, **kwargs)
     
+    @transaction.atomic
     def complete(self, transaction_id=''):
         """Mark refund as completed"""
         self.status = 'completed'
@@ -152,6 +155,18 @@ class Refund(models.Model):
         self.refund_request.status = 'completed'
         self.refund_request.save()
 
+        # Returned goods go back on sale unless they arrived unsellable; a
+        # cancelled order's stock was already given back when it was cancelled
+        request = self.refund_request
+        if request.reason not in ('defective', 'damaged') and request.order.status != 'cancelled':
+            items = [request.order_item] if request.order_item_id else request.order.items.all()
+            restock([(item.product_id, item.quantity) for item in items], 'refund', request.order)
+
+        events.record(
+            self.order, 'refunded',
+            refund_number=self.refund_number, amount=str(self.amount), order_item=request.order_item_id,
+        )
+
 
 class StoreCredit(models.Model):
     """Store credit for users"""
@@ -3,6 +3,7 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.http import JsonResponse
 from .models import RefundRequest, Refund, StoreCredit
+from orders.idempotency import idempotent
 from orders.models import Order, OrderItem
 from decimal import Decimal
 
@@ -30,6 +31,7 @@ def refund_request_detail(request, request_number):
 
 
 @login_required
+@idempotent
 def create_refund_request(request, order_number):
     """Create a refund request for an order"""
     order = get_object_or_404(Order, order_number=order_number, user=request.user)
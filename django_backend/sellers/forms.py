@@ -1,8 +1,9 @@
 from django import forms
+from store.inventory import StockEditForm
 from store.models import Product, ProductImage, Category
 
 
-class ProductForm(forms.ModelForm):
+class ProductForm(StockEditForm):
     class Meta:
         model = Product
         fields = ['name', 'category', 'description', 'price', 'stock', 'image', 'is_active', 'is_featured']
@@ -1,12 +1,13 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Sum, Count, Q
+from django.db.models import Sum, Count
 from django.utils import timezone
 from datetime import timedelta
 from accounts.decorators import seller_required
 from store.models import Product, ProductImage, Category
-from orders.models import Order, OrderItem
+from store.search import search_products
+from orders.models import ShopOrder
 from payments.models import SellerWallet, Earning
 from .forms import ProductForm, ProductImageForm
 
@@ -31,11 +32,11 @@ def seller_dashboard(request):
     out_of_stock = products.filter(stock=0).count()
     
     # Get orders
-    order_items = OrderItem.objects.filter(shop=shop)
-    total_orders = order_items.values('order').distinct().count()
+    shop_orders = ShopOrder.objects.filter(shop=shop)
+    total_orders = shop_orders.count()
     
     # Recent orders
-    recent_orders = order_items.select_related('order', 'product').order_by('-created_at')[:10]
+    recent_orders = shop_orders[:10]
     
     # Earnings this month
     month_start = timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
@@ -71,10 +72,7 @@ def product_list(request):
     # Search
     search_query = request.GET.get('search', '')
     if search_query:
-        products = products.filter(
-            Q(name__icontains=search_query) | 
-            Q(description__icontains=search_query)
-        )
+        products = search_products(products, search_query)
     
     # Filter by status
     status = request.GET.get('status', '')
@@ -227,15 +225,15 @@ def order_list(request):
         return redirect('shops:create_shop')
     
     shop = request.user.shop
-    order_items = OrderItem.objects.filter(shop=shop).select_related('order', 'product').order_by('-created_at')
+    shop_orders = ShopOrder.objects.filter(shop=shop)
     
     # Filter by status
     status = request.GET.get('status', '')
     if status:
-        order_items = order_items.filter(order__status=status)
+        shop_orders = shop_orders.filter(status=status)
     
     context = {
-        'order_items': order_items,
+        'shop_orders': shop_orders,
         'status': status,
     }
     return render(request, 'sellers/order_list.html', context)
@@ -249,16 +247,22 @@ def order_detail(request, order_number):
         messages.info(request, 'Please create your shop first.')
         return redirect('shops:create_shop')
     
-    order = get_object_or_404(Order, order_number=order_number)
-    
-    # Check if seller has items in this order
-    order_items = order.items.filter(shop=request.user.shop)
-    if not order_items.exists():
+    # Sellers only see orders with items from their shop
+    shop_order = (
+        ShopOrder.objects.filter(shop=request.user.shop, order_number=order_number)
+        .select_related('order__shipping_address')
+        .first()
+    )
+    if shop_order is None:
         messages.error(request, 'You do not have access to this order.')
         return redirect('sellers:order_list')
     
+    order = shop_order.order
+    order_items = order.items.filter(shop=request.user.shop).select_related('product')
+    
     context = {
         'order': order,
+        'shop_order': shop_order,
         'order_items': order_items,
     }
     return render(request, 'sellers/order_detail.html', context)
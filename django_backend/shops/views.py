@@ -3,6 +3,7 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from accounts.decorators import seller_required
 from .models import Shop
+from store.models import ProductCard
 from .forms import ShopCreateForm, ShopUpdateForm
 
 
@@ -50,7 +51,7 @@ def update_shop_view(request):
 def shop_detail_view(request, slug):
     """Public shop detail page"""
     shop = get_object_or_404(Shop, slug=slug, is_active=True)
-    products = shop.products.filter(is_active=True)[:12]
+    products = ProductCard.objects.filter(shop=shop)[:12]
     
     context = {
         'shop': shop,
@@ -1,5 +1,7 @@
 from django.contrib import admin
+from .inventory import StockEditForm
 from .models import Product, Category, ProductImage
+from .search import search_products
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -14,12 +16,18 @@ class ProductImageInline(admin.TabularInline):
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
+    form = StockEditForm
     list_display = ("id", "name", "shop", "category", "price", "stock", "is_featured", "is_active", "created_at")
     search_fields = ("name", "description")
     prepopulated_fields = {"slug": ("name",)}
     list_filter = ("is_active", "is_featured", "category", "shop")
     inlines = [ProductImageInline]
 
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        return search_products(queryset, search_term), False
+
 @admin.register(ProductImage)
 class ProductImageAdmin(admin.ModelAdmin):
     list_display = ("id", "product", "is_primary", "created_at")
@@ -0,0 +1,198 @@
+"""
+Read-only catalog feed for the mobile app and partner integrations.
+
+Rows are read with ``.values().iterator()`` and written straight into a
+``StreamingHttpResponse``, so a page of any size is served in constant
+memory without building ``Product`` instances. Every response carries an
+``ETag`` and ``Last-Modified`` derived from the matching products; the ETag
+also covers the normalized request (filters, fields, ordering, limit and
+cursor), so two different pages never share one. Conditional requests are
+answered with 304 before the catalog is read.
+"""
+import hashlib
+from calendar import timegm
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Count, Max
+from django.http import StreamingHttpResponse
+from django.utils.http import http_date
+
+from .cache import catalog_version
+from .models import Category, Product
+from .pagination import ORDERINGS, CursorPaginator
+
+API_PER_PAGE = 100
+API_MAX_PER_PAGE = 1000
+ITERATOR_CHUNK_SIZE = 500
+FLUSH_EVERY = 100
+API_ORDERINGS = ("-id", "-created_at", "price", "-price")
+
+# Public field name -> lookup selected with .values()
+API_FIELDS = {
+    "id": "id",
+    "name": "name",
+    "slug": "slug",
+    "description": "description",
+    "price": "price",
+    "stock": "stock",
+    "is_featured": "is_featured",
+    "category": "category__slug",
+    "shop_id": "shop_id",
+    "shop": "shop__name",
+    "image": "image",
+    "created_at": "created_at",
+    "updated_at": "updated_at",
+}
+DEFAULT_FIELDS = ("id", "name", "slug", "price", "stock", "category", "shop", "image", "updated_at")
+
+
+class CatalogFeed:
+    """One validated feed request: filters, field selection and page window."""
+
+    def __init__(self, queryset, fields, ordering="-id", per_page=API_PER_PAGE, cursor=None, filters=()):
+        self.queryset = queryset
+        self.fields = fields
+        # Normalized ``(name, value)`` pairs behind ``queryset``, for the ETag
+        self.filters = tuple(filters)
+        self.paginator = CursorPaginator(
+            queryset.values(*self._lookups(fields, ordering)),
+            ordering,
+            per_page,
+            max_per_page=API_MAX_PER_PAGE,
+        )
+        self.cursor = cursor
+        self._validators = None
+
+    @staticmethod
+    def _lookups(fields, ordering):
+        lookups = [API_FIELDS[name] for name in fields]
+        # The cursor is built from the ordering keys, so they are always read.
+        for key in ORDERINGS[ordering]:
+            if key.lstrip("-") not in lookups:
+                lookups.append(key.lstrip("-"))
+        return lookups
+
+    @classmethod
+    def from_request(cls, request):
+        """Build a feed from query parameters; raises ``ValueError`` on bad input."""
+        params = request.GET
+
+        fields = DEFAULT_FIELDS
+        if params.get("fields"):
+            fields = tuple(dict.fromkeys(f.strip() for f in params["fields"].split(",") if f.strip()))
+            unknown = [name for name in fields if name not in API_FIELDS]
+            if unknown or not fields:
+                raise ValueError(f"Unknown fields: {', '.join(unknown) or '(none)'}")
+
+        ordering = params.get("ordering", "-id")
+        if ordering not in API_ORDERINGS:
+            raise ValueError(f"Unsupported ordering, use one of: {', '.join(API_ORDERINGS)}")
+
+        try:
+            per_page = int(params.get("limit", API_PER_PAGE))
+        except ValueError:
+            raise ValueError("limit must be an integer")
+
+        queryset = Product.objects.filter(is_active=True)
+        filters = []
+        if params.get("category"):
+            category = Category.objects.filter(slug=params["category"], is_active=True).first()
+            if category is None:
+                raise ValueError("Unknown category")
+            queryset = queryset.filter(category.subtree_q("category__path"))
+            filters.append(("category", category.pk))
+        if params.get("shop"):
+            try:
+                shop_id = int(params["shop"])
+            except ValueError:
+                raise ValueError("shop must be an integer id")
+            queryset = queryset.filter(shop_id=shop_id)
+            filters.append(("shop", shop_id))
+        if params.get("featured") in ("1", "true"):
+            queryset = queryset.filter(is_featured=True)
+            filters.append(("featured", True))
+
+        return cls(queryset, fields, ordering, per_page, params.get("cursor"), filters)
+
+    def variant(self):
+        """The normalized request: what besides the catalog decides the page's content."""
+        cursor = self.cursor if self.paginator.decode_cursor(self.cursor) is not None else ""
+        return (
+            f"{self.filters!r}:{','.join(self.fields)}:{self.paginator.ordering}:"
+            f"{self.paginator.per_page}:{cursor}"
+        )
+
+    def validators(self):
+        """``(etag, last_modified)`` for the whole filtered catalog, in one query."""
+        if self._validators is None:
+            stats = self.queryset.aggregate(count=Count("id"), latest=Max("updated_at"))
+            latest = stats["latest"]
+            fingerprint = (
+                f"{catalog_version()}:{stats['count']}:{latest.isoformat() if latest else ''}:{self.variant()}"
+            )
+            etag = '"%s"' % hashlib.md5(fingerprint.encode()).hexdigest()
+            last_modified = timegm(latest.utctimetuple()) if latest else None
+            self._validators = (etag, last_modified)
+        return self._validators
+
+    def _serializer(self):
+        image_storage = Product._meta.get_field("image").storage
+        pairs = [(name, API_FIELDS[name]) for name in self.fields]
+
+        def serialize(row):
+            item = {name: row[lookup] for name, lookup in pairs}
+            if item.get("image"):
+                item["image"] = image_storage.url(item["image"])
+            elif "image" in item:
+                item["image"] = None
+            return item
+        return serialize
+
+    def chunks(self, next_url_for=None):
+        """Yield the JSON document for this page in pieces."""
+        queryset, _ = self.paginator.window(self.cursor)
+        encode = DjangoJSONEncoder(separators=(",", ":")).encode
+        serialize = self._serializer()
+
+        buffer = ['{"results":[']
+        last_row = None
+        written = 0
+        has_next = False
+        for row in queryset.iterator(chunk_size=ITERATOR_CHUNK_SIZE):
+            if written == self.paginator.per_page:
+                has_next = True
+                break
+            buffer.append(("," if written else "") + encode(serialize(row)))
+            last_row = row
+            written += 1
+            if len(buffer) >= FLUSH_EVERY:
+                yield "".join(buffer)
+                buffer = []
+
+        next_cursor = self.paginator.encode_cursor(last_row) if has_next else None
+        tail = {
+            "count": written,
+            "next_cursor": next_cursor,
+            "has_next": has_next,
+            "next_url": next_url_for(next_cursor) if next_cursor and next_url_for else None,
+        }
+        buffer.append("]," + encode(tail)[1:])
+        yield "".join(buffer)
+
+    def response(self, request):
+        def next_url_for(cursor):
+            params = request.GET.copy()
+            params["cursor"] = cursor
+            return request.build_absolute_uri(f"{request.path}?{params.urlencode()}")
+
+        response = StreamingHttpResponse(self.chunks(next_url_for), content_type="application/json")
+        self.set_validators(response)
+        return response
+
+    def set_validators(self, response):
+        etag, last_modified = self.validators()
+        response.headers["ETag"] = etag
+        if last_modified is not None:
+            response.headers["Last-Modified"] = http_date(last_modified)
+        response.headers["Cache-Control"] = "no-cache"
+        return response
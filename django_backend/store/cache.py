@@ -0,0 +1,39 @@
+"""
+Version-stamped caching for catalog pages.
+
+Rendered fragments are cached under keys that embed a version number held
+in the shared cache. Catalog writes bump the number (see ``store.signals``),
+which orphans every old fragment at once instead of deleting keys one by one.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+CATALOG_VERSION_KEY = "store:catalog_version"
+
+
+def get_version(key):
+    version = cache.get(key)
+    if version is None:
+        version = 1
+        cache.add(key, version, None)
+    return version
+
+
+def bump_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 2, None)
+
+
+def catalog_version():
+    """Current catalog version, part of every catalog fragment cache key"""
+    return get_version(CATALOG_VERSION_KEY)
+
+
+def bump_catalog_version():
+    bump_version(CATALOG_VERSION_KEY)
+
+
+def fragment_timeout():
+    return getattr(settings, "CATALOG_CACHE_TIMEOUT", 60 * 15)
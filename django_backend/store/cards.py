@@ -0,0 +1,193 @@
+"""
+``ProductCard`` maintenance and listing queries.
+
+A card copies what a listing tile shows: name, price, the best running
+promotion price, stock flag, primary image and shop name. Only active
+products have cards, so listings are single-table index scans. Cards are
+refreshed by the handlers in ``store.signals`` and ``promotions.signals``;
+``manage.py rebuild_product_cards`` rebuilds them all, and with ``--due``
+re-prices cards whose promotion window has opened or closed (run it from
+cron every few minutes).
+"""
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Q
+from django.utils import timezone
+from django.utils.text import Truncator
+
+from .cache import bump_catalog_version
+from .models import Category, Product, ProductCard, ProductImage
+from .search import search_products
+
+BATCH_SIZE = 500
+CARD_FIELDS = [
+    'shop', 'shop_name', 'shop_slug', 'category_id', 'name', 'slug', 'summary',
+    'image', 'price', 'sale_price', 'sale_event_id', 'priced_until', 'in_stock', 'is_featured',
+    'created_at',
+]
+
+
+def _events_by_product(products, now):
+    """``{product id: [events]}`` for running and upcoming promotions."""
+    from promotions.models import Event
+
+    product_ids = [product.pk for product in products]
+    category_ids = {product.category_id for product in products if product.category_id}
+    events = Event.objects.filter(
+        Q(products__in=product_ids) | Q(categories__in=category_ids),
+        is_active=True,
+        end_date__gt=now,
+    ).distinct().in_bulk()
+    if not events:
+        return {}
+
+    by_product, by_category = {}, {}
+    for product_id, event_id in Event.products.through.objects.filter(
+        event_id__in=events, product_id__in=product_ids
+    ).values_list('product_id', 'event_id'):
+        by_product.setdefault(product_id, set()).add(event_id)
+    for category_id, event_id in Event.categories.through.objects.filter(
+        event_id__in=events, category_id__in=category_ids
+    ).values_list('category_id', 'event_id'):
+        by_category.setdefault(category_id, set()).add(event_id)
+
+    return {
+        product.pk: [
+            events[event_id]
+            for event_id in by_product.get(product.pk, set()) | by_category.get(product.category_id, set())
+        ]
+        for product in products
+    }
+
+
+def _pricing(product, events, now):
+    """``(sale price, event id, priced until)`` from the events touching ``product``."""
+    from promotions.pricing import best_event, discounted
+
+    running = [event for event in events if event.start_date <= now]
+    upcoming = [event for event in events if event.start_date > now]
+    boundaries = [event.end_date for event in running] + [event.start_date for event in upcoming]
+    priced_until = min(boundaries) if boundaries else None
+    if not running:
+        return None, None, priced_until
+    best = best_event(running)
+    return discounted(product.price, best.discount_percentage), best.pk, priced_until
+
+
+def _build_cards(products):
+    now = timezone.now()
+    events = _events_by_product(products, now)
+    gallery = {}
+    for product_id, image in ProductImage.objects.filter(
+        product__in=[product.pk for product in products if not product.image]
+    ).values_list('product_id', 'image'):
+        gallery.setdefault(product_id, image)  # Meta.ordering puts the primary image first
+
+    cards = []
+    for product in products:
+        sale_price, sale_event_id, priced_until = _pricing(product, events.get(product.pk, []), now)
+        cards.append(ProductCard(
+            id=product.pk,
+            shop_id=product.shop_id,
+            shop_name=product.shop.name,
+            shop_slug=product.shop.slug,
+            category_id=product.category_id,
+            name=product.name,
+            slug=product.slug,
+            summary=Truncator(product.description or '').chars(255),
+            image=product.image.name if product.image else gallery.get(product.pk, ''),
+            price=product.price,
+            sale_price=sale_price,
+            sale_event_id=sale_event_id,
+            priced_until=priced_until,
+            in_stock=product.in_stock,
+            is_featured=product.is_featured,
+            created_at=product.created_at,
+        ))
+    return cards
+
+
+def refresh_cards(product_ids):
+    """Rebuild the cards for ``product_ids``, dropping those no longer active."""
+    product_ids = list(product_ids)
+    for start in range(0, len(product_ids), BATCH_SIZE):
+        batch = product_ids[start:start + BATCH_SIZE]
+        products = list(
+            Product.objects.filter(pk__in=batch, is_active=True).select_related('shop')
+        )
+        with transaction.atomic():
+            ProductCard.objects.filter(pk__in=batch).exclude(pk__in=[p.pk for p in products]).delete()
+            ProductCard.objects.bulk_create(
+                _build_cards(products),
+                update_conflicts=True,
+                unique_fields=['id'],
+                update_fields=CARD_FIELDS,
+            )
+
+
+def refresh_card(product):
+    refresh_cards([product.pk])
+
+
+def refresh_shop_cards(shop):
+    ProductCard.objects.filter(shop=shop).update(shop_name=shop.name, shop_slug=shop.slug)
+
+
+def sync_stock(product_ids):
+    """
+    Copy the stock flag after ``update()``s that bypass the save signals.
+
+    Cached fragments show the flag, so the catalog version is bumped when
+    any card's flag flipped.
+    """
+    in_stock = Exists(Product.objects.filter(pk=OuterRef('pk'), stock__gt=F('reserved')))
+    flipped = list(
+        ProductCard.objects.filter(pk__in=product_ids)
+        .annotate(now_in_stock=in_stock)
+        .exclude(in_stock=F('now_in_stock'))
+        .values_list('pk', flat=True)
+    )
+    if flipped:
+        ProductCard.objects.filter(pk__in=flipped).update(in_stock=in_stock)
+        bump_catalog_version()
+    return len(flipped)
+
+
+def detach_category_cards(category_id):
+    """Products of a deleted category are set to no category without signals."""
+    ProductCard.objects.filter(category_id=category_id).update(category_id=None)
+
+
+def refresh_event_cards(event):
+    """Re-price every product an event touches or was the best offer for."""
+    product_ids = set(event.products.values_list('pk', flat=True))
+    product_ids.update(
+        Product.objects.filter(category__in=event.categories.all()).values_list('pk', flat=True)
+    )
+    product_ids.update(ProductCard.objects.filter(sale_event_id=event.pk).values_list('pk', flat=True))
+    refresh_cards(product_ids)
+
+
+def refresh_due_cards():
+    """Re-price cards whose promotion window has opened or closed."""
+    due = list(ProductCard.objects.filter(priced_until__lte=timezone.now()).values_list('pk', flat=True))
+    refresh_cards(due)
+    return len(due)
+
+
+def rebuild_all_cards():
+    ProductCard.objects.exclude(pk__in=Product.objects.filter(is_active=True).values('pk')).delete()
+    product_ids = list(Product.objects.filter(is_active=True).values_list('pk', flat=True))
+    refresh_cards(product_ids)
+    return len(product_ids)
+
+
+# -------------------- Listing queries --------------------
+
+def in_category(cards, category):
+    """Cards in ``category`` or any of its descendants."""
+    return cards.filter(category_id__in=Category.objects.filter(category.subtree_q()).values('pk'))
+
+
+def search_cards(cards, query):
+    """Full-text filter for cards, annotated with ``search_rank``; card ids are product ids."""
+    return search_products(cards, query)
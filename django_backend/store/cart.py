@@ -0,0 +1,244 @@
+"""
+The shopping cart.
+
+Carts are stored outside the session. Each cart is one ``{product id:
+quantity}`` entry in the ``carts`` cache, filled from ``CartLine`` rows on
+a miss. Changing the cart upserts only the changed rows and drops the
+cache entry, instead of re-serializing the whole session. Signed-in carts
+are keyed by user; anonymous carts by a token kept in the session (written
+once, on the first add) and merged into the user's cart at login (see
+``store.signals``).
+``CartLine`` is the source of truth: production without Redis configures a
+dummy ``carts`` cache, so every read goes to the table.
+
+Carts stored in the session by older code, as ``{product id: quantity}``
+or ``{"qty", "price", "name"}`` dicts, are moved into the store on first
+read. Prices are never taken from the cart: ``Cart.lines`` loads every
+product in one query and prices it through ``promotions.pricing``.
+"""
+import secrets
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+from .models import CartLine, Product
+
+SESSION_KEY = 'cart'
+TOKEN_SESSION_KEY = 'cart_token'
+
+
+def _quantity(value):
+    if isinstance(value, dict):
+        value = value.get('qty', value.get('quantity', 1))
+    try:
+        return max(0, int(value))
+    except (TypeError, ValueError):
+        return 0
+
+
+# -------------------- Storage --------------------
+
+def _cache():
+    return caches[getattr(settings, 'CART_CACHE_ALIAS', 'carts')]
+
+
+def _cache_key(cart_key):
+    return f"cart:{cart_key}"
+
+
+def _cache_set(cart_key, quantities):
+    _cache().set(_cache_key(cart_key), quantities, getattr(settings, 'CART_CACHE_TIMEOUT', 60 * 60 * 24 * 7))
+
+
+def load_cart(cart_key):
+    """``{product id (str): qty}`` for ``cart_key``, from the cache or ``CartLine``."""
+    quantities = _cache().get(_cache_key(cart_key))
+    if quantities is None:
+        quantities = {
+            str(product_id): qty
+            for product_id, qty in CartLine.objects.filter(cart_key=cart_key)
+            .order_by('id')
+            .values_list('product_id', 'qty')
+        }
+        _cache_set(cart_key, quantities)
+    return quantities
+
+
+def save_lines(cart_key, quantities, changed):
+    """Write the ``changed`` product ids of ``quantities`` to ``CartLine``; the next load re-caches it."""
+    now = timezone.now()
+    upserts = [
+        CartLine(cart_key=cart_key, product_id=int(product_id), qty=quantities[product_id], updated_at=now)
+        for product_id in changed
+        if product_id in quantities
+    ]
+    removed = [int(product_id) for product_id in changed if product_id not in quantities]
+    if upserts:
+        CartLine.objects.bulk_create(
+            upserts,
+            update_conflicts=True,
+            unique_fields=['cart_key', 'product'],
+            update_fields=['qty', 'updated_at'],
+        )
+    if removed:
+        CartLine.objects.filter(cart_key=cart_key, product_id__in=removed).delete()
+    # Not _cache_set(quantities): a concurrent change (another tab, a double
+    # click) would lose its line in the cache while CartLine keeps it. Drop
+    # the entry again on commit in case a reader re-cached the old rows.
+    _cache().delete(_cache_key(cart_key))
+    transaction.on_commit(lambda: _cache().delete(_cache_key(cart_key)))
+
+
+def delete_cart(cart_key):
+    CartLine.objects.filter(cart_key=cart_key).delete()
+    _cache().delete(_cache_key(cart_key))
+
+
+def merge_carts(source_key, target_key):
+    """Add the ``source_key`` cart into ``target_key`` and delete it."""
+    source = load_cart(source_key)
+    if not source:
+        return
+    target = dict(load_cart(target_key))
+    for product_id, qty in source.items():
+        target[product_id] = target.get(product_id, 0) + qty
+    save_lines(target_key, target, source)
+    delete_cart(source_key)
+
+
+def prune_anonymous_carts(days):
+    """Delete anonymous carts untouched for ``days``; returns how many."""
+    cutoff = timezone.now() - timedelta(days=days)
+    stale = CartLine.objects.filter(cart_key__startswith='anon:')
+    stale = stale.exclude(cart_key__in=stale.filter(updated_at__gte=cutoff).values('cart_key'))
+    keys = list(stale.values_list('cart_key', flat=True).distinct())
+    for start in range(0, len(keys), 500):
+        batch = keys[start:start + 500]
+        CartLine.objects.filter(cart_key__in=batch).delete()
+        _cache().delete_many([_cache_key(key) for key in batch])
+    return len(keys)
+
+
+def user_cart_key(user):
+    return f"user:{user.pk}"
+
+
+def session_cart_key(session, create=False):
+    token = session.get(TOKEN_SESSION_KEY)
+    if token is None and create:
+        token = session[TOKEN_SESSION_KEY] = secrets.token_urlsafe(16)
+    return f"anon:{token}" if token else None
+
+
+# -------------------- Cart --------------------
+
+class CartItem:
+    """One product in the cart, at its current (possibly sale) price."""
+
+    def __init__(self, product, qty):
+        self.product = product
+        self.qty = qty
+        self.price = product.current_price
+        self.line_total = self.price * qty
+
+
+class Cart:
+    def __init__(self, request):
+        self.request = request
+        self.key = self._key(create=False)
+        self.quantities = dict(load_cart(self.key)) if self.key else {}
+        legacy = request.session.pop(SESSION_KEY, None)
+        if legacy is not None:
+            self._import(legacy)
+
+    def _key(self, create):
+        user = getattr(self.request, 'user', None)
+        if user is not None and user.is_authenticated:
+            return user_cart_key(user)
+        return session_cart_key(self.request.session, create)
+
+    def _import(self, legacy):
+        quantities = {}
+        for product_id, value in legacy.items():
+            try:
+                quantities[int(product_id)] = _quantity(value)
+            except (TypeError, ValueError):
+                continue
+        changed = []
+        for product_id in Product.objects.filter(pk__in=quantities).values_list('pk', flat=True):
+            qty = quantities[product_id]
+            product_id = str(product_id)
+            if qty:
+                self.quantities[product_id] = self.quantities.get(product_id, 0) + qty
+                changed.append(product_id)
+        if changed:
+            self._save(changed)
+
+    def __bool__(self):
+        return bool(self.quantities)
+
+    def __len__(self):
+        return len(self.quantities)
+
+    def __iter__(self):
+        return iter(self.lines)
+
+    @property
+    def count(self):
+        """Total quantity, for cart badges"""
+        return sum(self.quantities.values())
+
+    @cached_property
+    def lines(self):
+        """``CartItem`` per active product, in the order they were added"""
+        from promotions.pricing import apply_prices
+
+        products = (
+            Product.objects.filter(is_active=True)
+            .select_related('shop')
+            .in_bulk([int(product_id) for product_id in self.quantities])
+        )
+        apply_prices(products.values())
+        return [
+            CartItem(products[int(product_id)], qty)
+            for product_id, qty in self.quantities.items()
+            if int(product_id) in products
+        ]
+
+    @property
+    def subtotal(self):
+        return sum((line.line_total for line in self.lines), Decimal('0'))
+
+    def add(self, product_id, qty=1):
+        key = str(product_id)
+        self.set(product_id, self.quantities.get(key, 0) + qty)
+
+    def set(self, product_id, qty):
+        """Set a line's quantity; zero or less removes it."""
+        key = str(product_id)
+        if qty > 0:
+            self.quantities[key] = qty
+        elif key in self.quantities:
+            del self.quantities[key]
+        else:
+            return
+        self._save([key])
+
+    def remove(self, product_id):
+        self.set(product_id, 0)
+
+    def clear(self):
+        if self.key:
+            delete_cart(self.key)
+        self.quantities = {}
+        self.__dict__.pop('lines', None)
+
+    def _save(self, changed):
+        self.key = self.key or self._key(create=True)
+        save_lines(self.key, self.quantities, changed)
+        self.__dict__.pop('lines', None)
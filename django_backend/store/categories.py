@@ -0,0 +1,90 @@
+"""
+Process-local category tree for navigation.
+
+The active tree is loaded with one query and kept in memory until the
+version stamp in the shared cache changes. ``store.signals`` bumps the
+stamp whenever a category is saved or deleted. ``TREE_MAX_AGE`` is a safety
+net for deployments whose cache is not shared between worker processes.
+"""
+import threading
+import time
+
+from .cache import get_version, bump_version
+from .models import Category
+
+TREE_VERSION_KEY = "store:category_tree_version"
+TREE_MAX_AGE = 300
+
+_lock = threading.Lock()
+_snapshot = None  # (version, loaded_at, roots, nodes by id); replaced, never mutated
+
+
+def tree_version():
+    return get_version(TREE_VERSION_KEY)
+
+
+def bump_tree_version():
+    bump_version(TREE_VERSION_KEY)
+
+
+def _build_tree():
+    """Link active categories into a forest, skipping subtrees of inactive nodes"""
+    by_id = {}
+    roots = []
+    for category in Category.objects.filter(is_active=True).order_by("path"):
+        category.tree_children = []
+        if category.parent_id is None:
+            roots.append(category)
+        elif category.parent_id in by_id:
+            by_id[category.parent_id].tree_children.append(category)
+        else:
+            continue
+        by_id[category.pk] = category
+
+    sort_key = lambda category: category.name.lower()
+    roots.sort(key=sort_key)
+    for category in by_id.values():
+        category.tree_children.sort(key=sort_key)
+    return roots, by_id
+
+
+def _is_fresh(snapshot, version):
+    return (
+        snapshot is not None
+        and snapshot[0] == version
+        and time.monotonic() - snapshot[1] <= TREE_MAX_AGE
+    )
+
+
+def _current_snapshot():
+    global _snapshot
+    version = tree_version()
+    snapshot = _snapshot
+    if not _is_fresh(snapshot, version):
+        with _lock:
+            snapshot = _snapshot
+            if not _is_fresh(snapshot, version):
+                roots, by_id = _build_tree()
+                snapshot = _snapshot = (version, time.monotonic(), roots, by_id)
+    return snapshot
+
+
+def get_category_tree():
+    """Root categories, each with ``tree_children`` populated recursively"""
+    return _current_snapshot()[2]
+
+
+def get_category_node(category_id):
+    """The cached node for ``category_id`` or ``None`` if inactive/unknown"""
+    return _current_snapshot()[3].get(category_id)
+
+
+def get_active_categories():
+    """Every active category, depth-first in tree order"""
+    ordered = []
+    stack = list(reversed(get_category_tree()))
+    while stack:
+        category = stack.pop()
+        ordered.append(category)
+        stack.extend(reversed(category.tree_children))
+    return ordered
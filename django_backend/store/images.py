@@ -0,0 +1,173 @@
+"""
+Resized derivatives of uploaded images.
+
+Every upload gets WebP and JPEG copies at ``DERIVATIVE_WIDTHS``, written next
+to the original in ``MEDIA_ROOT`` ("products/tea.png" -> "products/tea.png.w480.webp").
+Resizing runs in a small process pool once the upload's transaction commits,
+so requests never wait on Pillow. When a batch is written, the derivatives
+found on disk are recorded in the cache (``derivatives``). Templates read
+that record through the ``responsive_img`` tag in
+``store.templatetags.images`` instead of statting files on every render.
+Until the files exist, the original is served.
+
+Only storages that expose local paths (``FileSystemStorage``) are supported.
+"""
+import hashlib
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+DERIVATIVE_WIDTHS = (240, 480, 960)
+DERIVATIVE_FORMATS = ("webp", "jpg")
+DEFAULT_WIDTH = 480
+WEBP_QUALITY = 80
+JPEG_QUALITY = 82
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def derivative_name(name, width, fmt):
+    # Keep the original's extension so "tea.png" and "tea.jpg" get their own files
+    return f"{name}.w{width}.{fmt}"
+
+
+def _local_path(storage, name):
+    try:
+        return storage.path(name)
+    except NotImplementedError:
+        return None
+
+
+def _cache_key(name):
+    return f"images:derivatives:{hashlib.md5(name.encode()).hexdigest()}"
+
+
+def derivatives(fieldfile):
+    """``{fmt: [(width, url)]}`` for the derivatives of ``fieldfile``, as last recorded."""
+    if not fieldfile:
+        return {}
+    found = cache.get(_cache_key(fieldfile.name))
+    if found is None:
+        found = remember(fieldfile.storage, fieldfile.name)
+    return found
+
+
+def remember(storage, name):
+    """Record which derivatives of ``name`` are on disk; returns them like ``derivatives``."""
+    found = {fmt: [] for fmt in DERIVATIVE_FORMATS}
+    for width in DERIVATIVE_WIDTHS:
+        for fmt in DERIVATIVE_FORMATS:
+            derivative = derivative_name(name, width, fmt)
+            path = _local_path(storage, derivative)
+            if path and os.path.exists(path):
+                found[fmt].append((width, storage.url(derivative)))
+    if any(found.values()):
+        timeout = getattr(settings, "IMAGE_DERIVATIVES_CACHE_TIMEOUT", 24 * 60 * 60)
+    else:
+        # Not built yet, or built by a process that could not reach this cache
+        timeout = 60
+    cache.set(_cache_key(name), found, timeout)
+    return found
+
+
+def generate_derivatives(path, widths=DERIVATIVE_WIDTHS):
+    """
+    Write the derivatives for the original at ``path``; returns the files written.
+
+    Widths at or above the original's are skipped, except that the smallest
+    width is always written (at the original size) so every image has at
+    least one derivative. Runs in a worker process, so it only takes and
+    returns plain values.
+    """
+    from PIL import Image, ImageOps
+
+    written = []
+    with Image.open(path) as original:
+        image = ImageOps.exif_transpose(original)
+        has_alpha = image.mode in ("RGBA", "LA") or "transparency" in image.info
+        image = image.convert("RGBA" if has_alpha else "RGB")
+        mtime = os.path.getmtime(path)
+
+        for width in sorted(widths):
+            if width >= image.width and width != min(widths):
+                continue
+            target_width = min(width, image.width)
+            height = max(1, round(image.height * target_width / image.width))
+            resized = image.resize((target_width, height), Image.LANCZOS) if target_width != image.width else image
+
+            for fmt in DERIVATIVE_FORMATS:
+                target = derivative_name(path, width, fmt)
+                if os.path.exists(target) and os.path.getmtime(target) >= mtime:
+                    continue
+                if fmt == "webp":
+                    resized.save(target, "WEBP", quality=WEBP_QUALITY, method=4)
+                else:
+                    flat = resized
+                    if has_alpha:
+                        flat = Image.new("RGB", resized.size, (255, 255, 255))
+                        flat.paste(resized, mask=resized.getchannel("A"))
+                    flat.save(target, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+                written.append(target)
+    return written
+
+
+def _pool():
+    """The per-process executor, recreated after a fork (e.g. gunicorn workers)."""
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            workers = getattr(settings, "IMAGE_DERIVATIVE_WORKERS", 2)
+            _executor = ProcessPoolExecutor(max_workers=workers)
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def needs_derivatives(fieldfile):
+    if not fieldfile:
+        return False
+    path = _local_path(fieldfile.storage, fieldfile.name)
+    if path is None or not os.path.exists(path):
+        return False
+    marker = derivative_name(path, min(DERIVATIVE_WIDTHS), "webp")
+    return not os.path.exists(marker) or os.path.getmtime(marker) < os.path.getmtime(path)
+
+
+def schedule(fieldfile):
+    """Queue derivative generation for ``fieldfile`` after the current transaction."""
+    if not needs_derivatives(fieldfile):
+        return
+    storage, name = fieldfile.storage, fieldfile.name
+    path = storage.path(name)
+    if getattr(settings, "IMAGE_DERIVATIVES_SYNC", False):
+        def build():
+            generate_derivatives(path)
+            remember(storage, name)
+        transaction.on_commit(build)
+    else:
+        transaction.on_commit(lambda: _pool().submit(generate_derivatives, path).add_done_callback(
+            lambda future: _finished(storage, name, future)
+        ))
+
+
+def _finished(storage, name, future):
+    if future.exception() is not None:
+        logger.error("Could not build image derivatives for %s", name, exc_info=future.exception())
+    else:
+        remember(storage, name)
+
+
+def schedule_fields(instance, field_names, update_fields=None):
+    """``post_save`` helper: queue every named image field that may have changed."""
+    for name in field_names:
+        if update_fields is not None and name not in update_fields:
+            continue
+        schedule(getattr(instance, name))
@@ -0,0 +1,132 @@
+"""
+Stock changes and the ``StockMovement`` ledger.
+
+Every change to ``Product.stock`` appends movements: sales and restocks
+through ``take_stock``/``restock`` (one ``bulk_create`` per call, in the
+same transaction as the conditional ``UPDATE`` that guards against
+overselling), and edits made by saving a product (seller form, admin)
+through the ``Product`` post_save handler in ``store.signals``. A saved
+edit is applied as a change from the stock the editor was shown
+(``StockEditForm`` carries it through the form), so sales made while the
+form was open are kept.
+
+A product's movements always add up to its stock. ``compact_movements``
+folds rows older than a cutoff into one ``snapshot`` row per product so
+the ledger stays small, and ``stock_drift`` lists products whose stock no
+longer matches their ledger (``manage.py compact_stock_movements``).
+"""
+from django import forms
+from django.db import transaction
+from django.db.models import F, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, Now
+from django.utils import timezone
+
+from . import cards
+from .models import Product, StockMovement
+
+COMPACT_BATCH_SIZE = 500
+
+
+def take_stock(lines, order=None, reason='sale'):
+    """
+    Decrement stock for each ``(product id, qty)`` not held for someone else.
+
+    Returns the ids that were short; nothing is recorded for them, and the
+    caller is expected to roll back its transaction.
+    """
+    short = []
+    # Update rows in a fixed order so concurrent orders cannot deadlock
+    for product_id, qty in sorted(lines):
+        taken = Product.objects.filter(pk=product_id, stock__gte=F('reserved') + qty).update(
+            stock=F('stock') - qty, updated_at=Now()
+        )
+        if not taken:
+            short.append(product_id)
+    if not short:
+        record([(product_id, -qty) for product_id, qty in lines], reason, order)
+    return short
+
+
+def restock(lines, reason, order=None):
+    """Put each ``(product id, qty)`` back on sale, e.g. after a cancellation."""
+    lines = [(product_id, qty) for product_id, qty in lines if product_id and qty]
+    with transaction.atomic():
+        for product_id, qty in sorted(lines):
+            Product.objects.filter(pk=product_id).update(stock=F('stock') + qty, updated_at=Now())
+        record(lines, reason, order)
+        product_ids = [product_id for product_id, _ in lines]
+        transaction.on_commit(lambda: cards.sync_stock(product_ids))
+
+
+def record(deltas, reason, order=None, note=''):
+    """Append one movement per ``(product id, signed qty)``."""
+    now = timezone.now()
+    StockMovement.objects.bulk_create([
+        StockMovement(product_id=product_id, quantity=qty, reason=reason, order=order, note=note, created_at=now)
+        for product_id, qty in deltas
+        if qty
+    ])
+
+
+def record_edit(product, created):
+    """Log a stock value written with ``Product.save()``, relative to what was loaded."""
+    previous = 0 if created else getattr(product, '_loaded_stock', None)
+    if previous is None or product.stock == previous:
+        return
+    record([(product.pk, product.stock - previous)], 'import' if created else 'adjust')
+    product._loaded_stock = product.stock
+
+
+class StockEditForm(forms.ModelForm):
+    """Base for product forms: posts back the stock shown, which ``Product.save`` edits from."""
+    stock_seen = forms.IntegerField(widget=forms.HiddenInput, required=False)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.pk:
+            self.initial.setdefault('stock_seen', self.instance.stock)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if self.instance.pk and cleaned_data.get('stock_seen') is not None:
+            self.instance._loaded_stock = cleaned_data['stock_seen']
+        return cleaned_data
+
+
+def compact_movements(before, batch_size=COMPACT_BATCH_SIZE):
+    """Fold movements created before ``before`` into one snapshot per product; returns rows removed."""
+    removed = 0
+    product_ids = list(
+        StockMovement.objects.filter(created_at__lt=before)
+        .order_by('product_id')
+        .values_list('product_id', flat=True)
+        .distinct()
+    )
+    for start in range(0, len(product_ids), batch_size):
+        batch = product_ids[start:start + batch_size]
+        with transaction.atomic():
+            old = StockMovement.objects.filter(product_id__in=batch, created_at__lt=before)
+            totals = dict(old.values('product_id').annotate(total=Sum('quantity')).values_list('product_id', 'total'))
+            removed += old.delete()[0]
+            StockMovement.objects.bulk_create([
+                StockMovement(product_id=product_id, quantity=total, reason='snapshot', created_at=before)
+                for product_id, total in totals.items()
+                if total
+            ])
+    return removed
+
+
+def stock_drift():
+    """Products whose stock differs from the sum of their movements, with the ledger total."""
+    ledger = (
+        StockMovement.objects.filter(product=OuterRef('pk'))
+        .order_by()
+        .values('product')
+        .annotate(total=Sum('quantity'))
+        .values('total')
+    )
+    return (
+        Product.objects.annotate(ledger=Coalesce(Subquery(ledger, output_field=IntegerField()), 0))
+        .exclude(stock=F('ledger'))
+        .order_by('pk')
+    )
@@ -0,0 +1,48 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from chat.models import Message
+from shops.models import Shop
+from store import images
+from store.models import Category, Product, ProductImage
+
+IMAGE_FIELDS = (
+    (Product, 'image'),
+    (ProductImage, 'image'),
+    (Category, 'image'),
+    (Shop, 'logo'),
+    (Shop, 'banner'),
+    (Message, 'image'),
+)
+
+
+class Command(BaseCommand):
+    help = "Generate missing resized derivatives for every uploaded image."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count).")
+
+    def handle(self, *args, **options):
+        fieldfiles = []
+        for model, field in IMAGE_FIELDS:
+            names = model.objects.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True})
+            for name in names.values_list(field, flat=True).iterator():
+                fieldfile = model._meta.get_field(field).attr_class(None, model._meta.get_field(field), name)
+                if images.needs_derivatives(fieldfile):
+                    fieldfiles.append(fieldfile)
+
+        written = failed = 0
+        with ProcessPoolExecutor(max_workers=options["workers"]) as pool:
+            futures = [(fieldfile, pool.submit(images.generate_derivatives, fieldfile.path)) for fieldfile in fieldfiles]
+            for fieldfile, future in futures:
+                try:
+                    written += len(future.result())
+                except Exception as exc:
+                    failed += 1
+                    self.stderr.write(f"{fieldfile.path}: {exc}")
+                else:
+                    images.remember(fieldfile.storage, fieldfile.name)
+        self.stdout.write(self.style.SUCCESS(
+            f"Processed {len(fieldfiles)} images, wrote {written} derivatives, {failed} failed."
+        ))
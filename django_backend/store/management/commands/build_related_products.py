@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from store import recommendations
+
+
+class Command(BaseCommand):
+    help = "Rebuild co-purchase \"related products\" from order history."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--top", type=int, default=recommendations.DEFAULT_TOP_N,
+                            help="Neighbours stored per product.")
+        parser.add_argument("--min-count", type=int, default=recommendations.MIN_CO_PURCHASES,
+                            help="Ignore pairs bought together fewer times than this.")
+
+    def handle(self, *args, **options):
+        built = recommendations.build_related_products(options["top"], options["min_count"])
+        self.stdout.write(self.style.SUCCESS(f"Stored related products for {built} products."))
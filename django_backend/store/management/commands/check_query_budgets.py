@@ -0,0 +1,362 @@
+"""
+Query-budget regression check for every URL in ``karupatti_shop.urls``.
+
+Creates a throwaway test database, seeds a realistic storefront (several
+shops, a category tree, orders, chats, a full cart ...), requests each URL
+as the relevant user and compares the number of SQL statements against
+``BUDGETS``. The write paths that matter most (adding to the cart and
+placing an order) are also posted to, see ``POST_BUDGETS``. Exits non-zero
+when a URL goes over budget, errors, or has no budget at all, so CI catches
+new N+1 queries::
+
+    python manage.py check_query_budgets
+    python manage.py check_query_budgets --report   # print counts only
+    python manage.py check_query_budgets -v 2       # also show repeated SQL
+
+How the budgets were chosen: each number is the count measured against the
+seed, and a request may run ``HEADROOM`` more. The headroom absorbs one-off
+statements (a savepoint pair, a lazily created row) but is smaller than the
+shortest list the seed renders (3 shops, 3 conversations, 4 orders, 6 cart
+lines), so a new per-row query still fails. A signed-in page starts at 4
+queries: session, user, and the wishlist badge's wishlist and item count
+(3 for a user without a wishlist).
+Comments note what the larger budgets spend the rest on, including the
+per-row lookups some views still make. Lower a budget when its view gets
+cheaper; raise it only with a comment saying why.
+"""
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from operator import attrgetter
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+from django.utils import timezone
+
+from karupatti_shop.querybudget import QueryRecorder
+from store.cart import load_cart, save_lines, session_cart_key, user_cart_key
+
+# Queries allowed over each measured count below
+HEADROOM = 2
+
+# url name -> (who is logged in, {url kwarg: attribute path on the seed}, measured queries)
+BUDGETS = {
+    # store
+    "store:home": (None, {}, 2),
+    "store:product_list": (None, {}, 2),
+    # product, related ids, related products, category, images (loaded twice), shop; session
+    "store:product_detail": (None, {"slug": "product.slug"}, 8),
+    "store:category_detail": (None, {"slug": "category.slug"}, 4),
+    "store:about": (None, {}, 1),
+    "store:contact": (None, {}, 1),
+    "store:products_api": (None, {}, 2),
+    # cart lines come from the cart cache; one query prices them
+    "store:cart": ("buyer", {}, 5),
+    "store:cart_add": ("buyer", {"product_id": "product.id"}, 1),
+    "store:cart_update": ("buyer", {"product_id": "product.id"}, 0),
+    "store:cart_remove": ("buyer", {"product_id": "product.id"}, 4),
+    "store:apply_coupon": ("buyer", {}, 0),
+    "store:checkout": ("buyer", {}, 0),
+    # accounts
+    "accounts:register": (None, {}, 1),
+    "accounts:login": (None, {}, 1),
+    "accounts:logout": ("buyer", {}, 4),
+    "accounts:dashboard": ("buyer", {}, 2),
+    "accounts:profile": ("buyer", {}, 5),
+    "accounts:address_list": ("buyer", {}, 5),
+    "accounts:address_create": ("buyer", {}, 4),
+    "accounts:address_edit": ("buyer", {"pk": "address.pk"}, 5),
+    "accounts:address_delete": ("buyer", {"pk": "address.pk"}, 5),
+    # shops
+    "shops:create_shop": ("seller", {}, 3),
+    "shops:update_shop": ("seller", {}, 4),
+    "shops:shop_list": (None, {}, 2),
+    "shops:shop_detail": (None, {"slug": "shop.slug"}, 3),
+    # dashboard
+    "dashboard:buyer_dashboard": ("buyer", {}, 4),
+    # shop, two product counts, wallet, recent earnings
+    "dashboard:seller_dashboard": ("seller", {}, 10),
+    # seven counts, then the shop of each of the 10 recent products (per-row; select_related would save 9)
+    "dashboard:admin_dashboard": ("admin", {}, 23),
+    # wishlist
+    "wishlist:wishlist": ("buyer", {}, 7),
+    "wishlist:add": ("buyer", {"product_id": "product.id"}, 5),
+    "wishlist:remove": ("buyer", {"item_id": "wishlist_item.id"}, 5),
+    "wishlist:clear": ("buyer", {}, 2),
+    # orders
+    # running promotions (event, products, categories), cart products, addresses twice
+    "orders:checkout": ("buyer", {}, 10),
+    "orders:create_order": ("buyer", {}, 2),
+    "orders:order_list": ("buyer", {}, 5),
+    # order, items, then product and shop per item (per-row: 3 items on the seed)
+    "orders:order_detail": ("buyer", {"order_number": "order.order_number"}, 12),
+    "orders:cancel_order": ("buyer", {"order_number": "order.order_number"}, 2),
+    # sellers
+    # shop, wallet, four counts, month earnings, recent shop orders
+    "sellers:dashboard": ("seller", {}, 11),
+    # shop, products, then the category per product (per-row: 6 products on the seed)
+    "sellers:product_list": ("seller", {}, 11),
+    "sellers:product_create": ("seller", {}, 5),
+    "sellers:product_update": ("seller", {"slug": "product.slug"}, 6),
+    "sellers:product_delete": ("seller", {"slug": "product.slug"}, 5),
+    "sellers:product_images": ("seller", {"slug": "product.slug"}, 6),
+    "sellers:delete_product_image": ("seller", {"image_id": "product_image.id"}, 5),
+    "sellers:order_list": ("seller", {}, 5),
+    "sellers:order_detail": ("seller", {"order_number": "order.order_number"}, 6),
+    "sellers:earnings": ("seller", {}, 7),
+    # promotions
+    "promotions:event_list": (None, {}, 3),
+    "promotions:event_detail": (None, {"slug": "event.slug"}, 3),
+    "promotions:coupons": ("buyer", {}, 5),
+    "promotions:apply_coupon": ("buyer", {}, 2),
+    "promotions:remove_coupon": ("buyer", {}, 2),
+    # chat
+    # conversations with unread counts, messages, then each message sender (per-row: 3 conversations)
+    "chat:conversation_list": ("buyer", {}, 9),
+    # conversation, both parties, mark-read UPDATE, messages, shop, product
+    "chat:conversation_detail": ("buyer", {"conversation_id": "conversation.id"}, 11),
+    "chat:send_message": ("buyer", {"conversation_id": "conversation.id"}, 2),
+    "chat:delete_conversation": ("buyer", {"conversation_id": "conversation.id"}, 2),
+    "chat:start_conversation": ("buyer", {"shop_id": "shop.id"}, 5),
+    "chat:unread_count": ("buyer", {}, 3),
+    # refunds
+    "refunds:refund_request_list": ("buyer", {}, 5),
+    "refunds:refund_request_detail": ("buyer", {"request_number": "refund_request.request_number"}, 6),
+    "refunds:create_refund_request": ("buyer", {"order_number": "order.order_number"}, 4),
+    "refunds:cancel_refund_request": ("buyer", {"request_number": "refund_request.request_number"}, 2),
+    # credit account (created on first visit), transactions
+    "refunds:store_credit_balance": ("buyer", {}, 8),
+    # payments
+    "payments:success": ("buyer", {}, 6),
+    "payments:cancel": ("buyer", {}, 4),
+    "payments:seller_payouts": ("seller", {}, 5),
+    "payments:request_payout": ("seller", {}, 2),
+}
+
+
+
+def add_to_cart_form(client, data):
+    return {"qty": 1}
+
+
+def order_form(payment_method):
+    """Form builder for ``orders:create_order``: loads the checkout page for its signed quote."""
+    def build(client, data):
+        response = client.get(reverse("orders:checkout"))
+        return {
+            "quote": response.context["quote"], "payment_method": payment_method,
+            "address_id": data.address.pk, "idempotency_key": uuid.uuid4().hex,
+        }
+    return build
+
+
+# scenario -> (url name, who is logged in, {url kwarg: seed path}, form builder, measured queries).
+# Form builders run before counting starts; each scenario starts from the seeded cart.
+POST_BUDGETS = {
+    # session, user, product, then one upsert of the cart line (BEGIN + INSERT ... ON CONFLICT)
+    "add to cart": ("store:cart_add", "buyer", {"product_id": "product.id"}, add_to_cart_form, 5),
+    # session, user; idempotency claim (4) and stored response; address; cart products;
+    # order, created event, items and shop orders in bulk (7 with the transaction and
+    # savepoint); one guarded reserve UPDATE per line (6 on the seed, by design: each
+    # checks its own row), holds in bulk, card stock check; session write (2)
+    "checkout (card payment)": ("orders:create_order", "buyer", {}, order_form("stripe"), 26),
+    # as above, with a guarded stock UPDATE per line and the stock movements in bulk
+    # instead of holds, and the cart cleared (2) instead of the session write
+    "place order (cash on delivery)": ("orders:create_order", "buyer", {}, order_form("cod"), 26),
+}
+
+# URLs that cannot be exercised offline, with the reason.
+EXEMPT = {
+    "orders:stripe_checkout": "calls the Stripe API",
+    "orders:paypal_checkout": "calls the PayPal API",
+    "payments:create_checkout_session": "calls the Stripe API",
+    "payments:stripe_webhook": "requires a signed Stripe payload",
+}
+
+SKIP_NAMESPACES = {"admin"}
+
+
+def iter_url_names(patterns=None, namespace=None):
+    """Yield ``namespace:name`` for every named URL pattern."""
+    patterns = get_resolver().url_patterns if patterns is None else patterns
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            if pattern.namespace in SKIP_NAMESPACES:
+                continue
+            inner = pattern.namespace or namespace
+            yield from iter_url_names(pattern.url_patterns, inner)
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            yield f"{namespace}:{pattern.name}" if namespace else pattern.name
+
+
+def seed():
+    """Build a storefront large enough for N+1 patterns to show up in the counts."""
+    from accounts.models import Address, CustomUser
+    from chat.models import Conversation, Message
+    from orders.models import Order, OrderItem, ShopOrder
+    from orders.placement import split_by_shop
+    from promotions.models import Coupon, Event
+    from refunds.models import RefundRequest
+    from shops.models import Shop
+    from store.models import Category, Product, ProductImage
+    from wishlist.models import Wishlist, WishlistItem
+
+    now = timezone.now()
+    buyer = CustomUser.objects.create_user("buyer", "buyer@example.com", "pw", role="buyer")
+    admin = CustomUser.objects.create_user("admin", "admin@example.com", "pw", role="admin", is_staff=True)
+
+    root = Category.objects.create(name="Jaggery", slug="jaggery")
+    categories = [root] + [
+        Category.objects.create(name=f"Jaggery {n}", slug=f"jaggery-{n}", parent=root) for n in range(3)
+    ]
+
+    shops, products = [], []
+    for s in range(3):
+        owner = CustomUser.objects.create_user(f"seller{s}", f"seller{s}@example.com", "pw", role="seller")
+        shop = Shop.objects.create(
+            owner=owner, name=f"Shop {s}", slug=f"shop-{s}", email=f"shop{s}@example.com",
+            phone="9000000000", address="Tirunelveli",
+        )
+        shops.append(shop)
+        for p in range(6):
+            products.append(Product.objects.create(
+                shop=shop, category=categories[p % len(categories)], name=f"Karupatti {s}-{p}",
+                slug=f"karupatti-{s}-{p}", description="Palm jaggery", price=Decimal("120.00") + p,
+                stock=50, is_featured=p < 2,
+            ))
+    shop = shops[0]
+    product = products[0]
+    product_image = ProductImage.objects.create(product=product, image="products/seed.jpg")
+
+    address = Address.objects.create(
+        user=buyer, full_name="Buyer", phone="9000000001", street_address="1 Main St",
+        city="Chennai", state="TN", country="India", postal_code="600001", is_default=True,
+    )
+
+    orders = []
+    for o in range(4):
+        order = Order.objects.create(
+            user=buyer, shipping_address=address, shipping_full_name="Buyer", shipping_phone="9000000001",
+            shipping_street="1 Main St", shipping_city="Chennai", shipping_state="TN",
+            shipping_country="India", shipping_postal_code="600001", subtotal=Decimal("360.00"),
+            total_amount=Decimal("360.00"), payment_method="cod", status="delivered",
+        )
+        items = [
+            OrderItem.objects.create(
+                order=order, product=item_product, shop=item_product.shop,
+                product_name=item_product.name, product_price=item_product.price, quantity=1,
+                seller_amount=item_product.price * Decimal("0.9"),
+                platform_fee=item_product.price * Decimal("0.1"),
+            )
+            for item_product in (products[o], products[6 + o], products[12 + o])
+        ]
+        ShopOrder.objects.bulk_create(split_by_shop(order, items))
+        orders.append(order)
+    order = orders[0]
+
+    refund_request = RefundRequest.objects.create(
+        order=order, user=buyer, reason="damaged", description="Box crushed",
+        refund_amount=Decimal("120.00"),
+    )
+
+    wishlist = Wishlist.objects.create(user=buyer)
+    wishlist_items = [WishlistItem.objects.create(wishlist=wishlist, product=p) for p in products[:4]]
+
+    conversations = []
+    for s in shops:
+        conversation = Conversation.objects.create(buyer=buyer, seller=s.owner, shop=s, product=products[0])
+        for m in range(3):
+            Message.objects.create(conversation=conversation, sender=s.owner, message=f"Hello {m}")
+        conversations.append(conversation)
+
+    event = Event.objects.create(
+        name="Pongal Sale", slug="pongal-sale", discount_percentage=Decimal("10"),
+        start_date=now - timedelta(days=1), end_date=now + timedelta(days=7),
+    )
+    event.products.add(*products[:4])
+    event.categories.add(categories[1])
+    Coupon.objects.create(
+        code="PONGAL10", discount_value=Decimal("10"), valid_from=now - timedelta(days=1),
+        valid_until=now + timedelta(days=7),
+    )
+
+    return SimpleNamespace(
+        buyer=buyer, seller=shop.owner, admin=admin, shop=shop, category=root, product=product,
+        product_image=product_image, products=products, address=address, order=order,
+        refund_request=refund_request, wishlist_item=wishlist_items[0], conversation=conversations[0],
+        event=event,
+    )
+
+
+class Command(BaseCommand):
+    help = "Fail if any URL runs more SQL queries than its budget against seeded data."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--report", action="store_true", help="Print counts without failing.")
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            problems = self.run_checks(options["verbosity"])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        if not problems:
+            self.stdout.write(self.style.SUCCESS("All URLs are within their query budgets."))
+        elif not options["report"]:
+            raise CommandError(f"{len(problems)} URL(s) failed their query budget:\n  " + "\n  ".join(problems))
+
+    def run_checks(self, verbosity):
+        data = seed()
+        problems = []
+        for name in sorted(set(iter_url_names())):
+            if name in EXEMPT:
+                continue
+            if name not in BUDGETS:
+                problems.append(f"{name}: no query budget")
+                continue
+            user, kwargs, budget = BUDGETS[name]
+            problems += self.measure(name, name, user, kwargs, None, budget, data, verbosity)
+        for scenario, (name, user, kwargs, build_form, budget) in POST_BUDGETS.items():
+            problems += self.measure(f"POST {scenario}", name, user, kwargs, build_form, budget, data, verbosity)
+        return problems
+
+    def measure(self, label, name, user, kwargs, build_form, budget, data, verbosity):
+        """Request ``name`` once (a POST when there is a form builder); returns its problems."""
+        url = reverse(name, kwargs={key: attrgetter(path)(data) for key, path in kwargs.items()})
+        client = Client(raise_request_exception=False)
+        if user:
+            client.force_login(getattr(data, user))
+            cart_key = user_cart_key(getattr(data, user))
+        else:
+            session = client.session
+            cart_key = session_cart_key(session, create=True)
+            session.save()
+            client.cookies["sessionid"] = session.session_key
+        quantities = {str(p.id): 2 for p in data.products[:6]}
+        save_lines(cart_key, quantities, quantities)
+        load_cart(cart_key)  # cached, as after the visitor's previous page view
+        form = build_form(client, data) if build_form else None
+
+        with QueryRecorder() as recorder:
+            response = client.post(url, form) if build_form else client.get(url)
+            if response.streaming:
+                b"".join(response.streaming_content)
+
+        line = f"{label} {url} -> {response.status_code}: {recorder.summary()} (budget {budget} + {HEADROOM})"
+        problems = []
+        if recorder.count > budget + HEADROOM or response.status_code >= 500:
+            problems.append(line)
+            self.stdout.write(self.style.ERROR(line))
+        else:
+            self.stdout.write(line)
+        if verbosity > 1:
+            for sql, times in recorder.duplicates().items():
+                self.stdout.write(f"    {times}x {sql}")
+        return problems
@@ -0,0 +1,30 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from store.inventory import compact_movements, stock_drift
+
+
+class Command(BaseCommand):
+    help = "Fold old stock movements into one snapshot per product, and check stock against the ledger."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=90,
+                            help="Keep movements newer than this many days as they are (default 90).")
+        parser.add_argument("--check", action="store_true",
+                            help="Only list products whose stock does not match their movements.")
+
+    def handle(self, *args, **options):
+        if options["check"]:
+            drifted = list(stock_drift().values_list("pk", "name", "stock", "ledger"))
+            for pk, name, stock, ledger in drifted:
+                self.stdout.write(f"{pk} {name}: stock {stock}, ledger {ledger}")
+            if drifted:
+                raise CommandError(f"{len(drifted)} products do not match their stock movements.")
+            self.stdout.write(self.style.SUCCESS("Stock matches the movement ledger."))
+            return
+
+        before = timezone.now() - timedelta(days=options["days"])
+        removed = compact_movements(before)
+        self.stdout.write(self.style.SUCCESS(f"Compacted {removed} stock movements."))
@@ -0,0 +1,42 @@
+import json
+import urllib.request
+
+from django.core.management.base import BaseCommand, CommandError
+
+from payments import webhooks
+
+
+class Command(BaseCommand):
+    help = "Send a signed, Stripe-shaped webhook event, for trying the webhook inbox locally."
+
+    def add_arguments(self, parser):
+        parser.add_argument("session_id", help="Checkout session id (Payment.stripe_session_id) the event is about.")
+        parser.add_argument("--type", default="checkout.session.completed", help="Event type.")
+        parser.add_argument("--event-id", help="Reuse an event id, to try a redelivery.")
+        parser.add_argument("--url",
+                            help="POST to a running server's webhook URL instead of storing the event directly.")
+
+    def handle(self, *args, **options):
+        session = {
+            "id": options["session_id"],
+            "object": "checkout.session",
+            "metadata": {},
+        }
+        event = webhooks.fake_event(options["type"], session, options["event_id"])
+        payload = json.dumps(event).encode()
+        header = webhooks.signature_header(payload)
+
+        if options["url"]:
+            request = urllib.request.Request(
+                options["url"], data=payload, method="POST",
+                headers={"Content-Type": "application/json", "Stripe-Signature": header},
+            )
+            with urllib.request.urlopen(request) as response:
+                self.stdout.write(f"{event['id']}: HTTP {response.status}")
+            return
+
+        try:
+            stored = webhooks.receive(payload, header)
+        except webhooks.InvalidSignature as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(f"{event['id']}: {'stored' if stored else 'duplicate, ignored'}")
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from orders.events import BATCH_SIZE, process_pending
+
+
+class Command(BaseCommand):
+    help = "Run the handlers for new order events (earnings, ...). Run from cron, or with --loop as a worker."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE,
+                            help=f"Events read per batch (default {BATCH_SIZE}).")
+        parser.add_argument("--loop", action="store_true",
+                            help="Keep polling for new events instead of exiting when none are left.")
+        parser.add_argument("--sleep", type=float, default=2.0,
+                            help="Seconds to wait between polls with --loop (default 2).")
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            handled = process_pending(batch_size=options["batch_size"])
+            total += handled
+            if handled:
+                continue
+            if not options["loop"]:
+                break
+            time.sleep(options["sleep"])
+        self.stdout.write(self.style.SUCCESS(f"Processed {total} order events."))
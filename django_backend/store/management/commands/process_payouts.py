@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from payments.payouts import CHUNK_SIZE, SettlementBlocked, run
+
+
+class Command(BaseCommand):
+    help = "Pay approved payout requests in one batch and write its settlement file."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE,
+                            help="Payout requests per transaction.")
+        parser.add_argument("--include-pending", action="store_true",
+                            help="Also pay requests that have not been approved yet.")
+
+    def handle(self, *args, **options):
+        statuses = ("pending", "approved") if options["include_pending"] else ("approved",)
+        try:
+            batch = run(chunk_size=options["chunk_size"], statuses=statuses)
+        except SettlementBlocked as exc:
+            raise CommandError(f"{exc}; it was left running for the next run.")
+        if batch is None:
+            self.stdout.write("No payouts to pay.")
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"Batch {batch.pk}: paid {batch.payout_count} payouts totalling {batch.total}; "
+            f"settlement file {batch.settlement_file}"
+        ))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from store.cart import prune_anonymous_carts
+
+
+class Command(BaseCommand):
+    help = "Delete anonymous carts nobody has touched for a while."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=30,
+                            help="Age in days of the newest line in a cart before it is deleted (default 30).")
+
+    def handle(self, *args, **options):
+        count = prune_anonymous_carts(options["days"])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {count} anonymous carts."))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from orders.idempotency import PRUNE_BATCH_SIZE, prune_expired
+
+
+class Command(BaseCommand):
+    help = "Delete expired idempotency records."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=PRUNE_BATCH_SIZE,
+                            help=f"Records deleted per statement (default {PRUNE_BATCH_SIZE}).")
+
+    def handle(self, *args, **options):
+        count = prune_expired(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {count} expired idempotency records."))
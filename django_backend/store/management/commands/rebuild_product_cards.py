@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from store import cards
+
+
+class Command(BaseCommand):
+    help = "Rebuild the ProductCard listing table, or with --due re-price cards whose promotion changed."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--due", action="store_true",
+                            help="Only cards whose promotion window has opened or closed.")
+
+    def handle(self, *args, **options):
+        if options["due"]:
+            count = cards.refresh_due_cards()
+            self.stdout.write(self.style.SUCCESS(f"Re-priced {count} product cards."))
+        else:
+            count = cards.rebuild_all_cards()
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} product cards."))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from store import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text product search index from the product table."
+
+    def handle(self, *args, **options):
+        engine = search.rebuild_index()
+        if engine is None:
+            self.stdout.write(self.style.WARNING("No full-text backend for this database; nothing to do."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt {engine} product search index."))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from payments.ledger import open_balances, reset_wallets, wallet_drift
+
+
+class Command(BaseCommand):
+    help = "Check seller wallet balances against the ledger."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--open", action="store_true",
+                            help="First write opening ledger entries for wallets that have none.")
+        parser.add_argument("--fix", action="store_true",
+                            help="Set drifted wallet balances to their ledger balance "
+                                 "(wallets without an opening entry are never lowered).")
+
+    def handle(self, *args, **options):
+        if options["open"]:
+            self.stdout.write(f"Opened the ledger for {open_balances()} wallets.")
+        drifted = list(wallet_drift().values_list("seller_id", "balance", "ledger"))
+        for seller_id, balance, ledger in drifted:
+            self.stdout.write(f"seller {seller_id}: wallet {balance}, ledger {ledger}")
+        if drifted and options["fix"]:
+            reset = reset_wallets()
+            self.stdout.write(self.style.SUCCESS(f"Reset {reset} wallets to their ledger balance."))
+            if reset < len(drifted):
+                raise CommandError(
+                    f"{len(drifted) - reset} wallets hold more than their ledger and have no opening entry; "
+                    "run with --open to bring it into the ledger."
+                )
+        elif drifted:
+            raise CommandError(f"{len(drifted)} wallets do not match the ledger.")
+        else:
+            self.stdout.write(self.style.SUCCESS("Wallets match the ledger."))
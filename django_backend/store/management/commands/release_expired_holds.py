@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from orders.holds import SWEEP_BATCH_SIZE, release_expired
+
+
+class Command(BaseCommand):
+    help = "Release expired stock holds and cancel their unpaid orders. Run from cron every minute or so."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=SWEEP_BATCH_SIZE,
+                            help=f"Holds released per transaction (default {SWEEP_BATCH_SIZE}).")
+
+    def handle(self, *args, **options):
+        count = release_expired(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Cancelled {count} unpaid orders with expired stock holds."))
@@ -0,0 +1,41 @@
+# Generated by Django 5.2 on 2026-10-18 09:14
+
+from django.db import migrations, models
+
+
+def build_category_paths(apps, schema_editor):
+    Category = apps.get_model('store', 'Category')
+    parents = dict(Category.objects.values_list('id', 'parent_id'))
+    paths = {}
+
+    def path_for(category_id):
+        if category_id not in paths:
+            parent_id = parents[category_id]
+            prefix = path_for(parent_id) if parent_id else ''
+            paths[category_id] = f"{prefix}{category_id}/"
+        return paths[category_id]
+
+    for category_id in parents:
+        path = path_for(category_id)
+        Category.objects.filter(pk=category_id).update(path=path, depth=path.count('/') - 1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0003_product_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(build_category_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,104 @@
+# Generated by Django 5.2 on 2026-10-18 09:26
+
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+from django.utils.text import Truncator
+
+BATCH_SIZE = 500
+
+
+def build_cards(apps, schema_editor):
+    """Fill the cards from the models as of this migration (the live ``store.cards`` may need later columns)."""
+    Product = apps.get_model('store', 'Product')
+    ProductImage = apps.get_model('store', 'ProductImage')
+    ProductCard = apps.get_model('store', 'ProductCard')
+    Event = apps.get_model('promotions', 'Event')
+
+    now = timezone.now()
+    events = Event.objects.filter(is_active=True, end_date__gt=now).in_bulk()
+    by_product, by_category = {}, {}
+    for target, through, column in (
+        (by_product, Event.products.through, 'product_id'),
+        (by_category, Event.categories.through, 'category_id'),
+    ):
+        for key, event_id in through.objects.filter(event_id__in=events).values_list(column, 'event_id'):
+            target.setdefault(key, []).append(events[event_id])
+
+    gallery = {}
+    for product_id, image in ProductImage.objects.order_by('-is_primary', 'created_at').values_list('product_id', 'image'):
+        gallery.setdefault(product_id, image)
+
+    cards = []
+    for product in Product.objects.filter(is_active=True).select_related('shop').iterator(chunk_size=BATCH_SIZE):
+        touching = by_product.get(product.pk, []) + by_category.get(product.category_id, [])
+        running = [event for event in touching if event.start_date <= now]
+        boundaries = [event.end_date for event in running]
+        boundaries += [event.start_date for event in touching if event.start_date > now]
+        sale_price = sale_event_id = None
+        if running:
+            best = max(running, key=lambda event: (event.discount_percentage, -event.pk))
+            sale_price = (product.price - product.price * best.discount_percentage / Decimal('100')).quantize(Decimal('0.01'))
+            sale_event_id = best.pk
+        cards.append(ProductCard(
+            id=product.pk,
+            shop_id=product.shop_id,
+            shop_name=product.shop.name,
+            shop_slug=product.shop.slug,
+            category_id=product.category_id,
+            name=product.name,
+            slug=product.slug,
+            summary=Truncator(product.description or '').chars(255),
+            image=product.image.name if product.image else gallery.get(product.pk, ''),
+            price=product.price,
+            sale_price=sale_price,
+            sale_event_id=sale_event_id,
+            priced_until=min(boundaries) if boundaries else None,
+            in_stock=product.stock > 0,
+            is_featured=product.is_featured,
+            created_at=product.created_at,
+        ))
+        if len(cards) >= BATCH_SIZE:
+            ProductCard.objects.bulk_create(cards)
+            cards = []
+    ProductCard.objects.bulk_create(cards)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shops', '0001_initial'),
+        ('promotions', '0001_initial'),
+        ('store', '0005_related_products'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductCard',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('shop_name', models.CharField(max_length=200)),
+                ('shop_slug', models.SlugField(max_length=200)),
+                ('category_id', models.BigIntegerField(blank=True, null=True)),
+                ('name', models.CharField(max_length=200)),
+                ('slug', models.SlugField(max_length=200)),
+                ('summary', models.CharField(blank=True, max_length=255)),
+                ('image', models.ImageField(blank=True, max_length=255, upload_to='')),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('sale_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('sale_event_id', models.BigIntegerField(blank=True, null=True)),
+                ('priced_until', models.DateTimeField(blank=True, db_index=True, null=True)),
+                ('in_stock', models.BooleanField(default=False)),
+                ('is_featured', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField()),
+                ('shop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='shops.shop')),
+            ],
+            options={
+                'ordering': ['-created_at', '-id'],
+                'indexes': [models.Index(fields=['-created_at', '-id'], name='store_card_new_idx'), models.Index(fields=['price', 'id'], name='store_card_price_idx'), models.Index(fields=['category_id', '-created_at', '-id'], name='store_card_cat_idx'), models.Index(fields=['shop', '-created_at', '-id'], name='store_card_shop_idx'), models.Index(fields=['is_featured', '-created_at', '-id'], name='store_card_featured_idx')],
+            },
+        ),
+        migrations.RunPython(build_cards, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2 on 2026-10-18 09:41
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def open_ledger(apps, schema_editor):
+    """Bring each product's current stock forward as its first movement."""
+    Product = apps.get_model('store', 'Product')
+    StockMovement = apps.get_model('store', 'StockMovement')
+    StockMovement.objects.bulk_create([
+        StockMovement(product_id=product_id, quantity=stock, reason='snapshot')
+        for product_id, stock in Product.objects.exclude(stock=0).values_list('pk', 'stock').iterator()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0002_stockhold'),
+        ('store', '0008_product_reserved'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField(help_text='Positive adds stock, negative removes it')),
+                ('reason', models.CharField(choices=[('sale', 'Sale'), ('cancel', 'Order cancelled'), ('refund', 'Refund'), ('adjust', 'Manual adjustment'), ('import', 'Import'), ('snapshot', 'Balance brought forward')], max_length=20)),
+                ('note', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('order', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='orders.order')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_movements', to='store.product')),
+            ],
+            options={
+                'ordering': ['-created_at', '-id'],
+                'indexes': [models.Index(fields=['product', 'created_at'], name='store_stockmove_product_idx'), models.Index(fields=['created_at'], name='store_stockmove_created_idx')],
+            },
+        ),
+        migrations.RunPython(open_ledger, migrations.RunPython.noop),
+    ]
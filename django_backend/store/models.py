@@ -1,7 +1,12 @@
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.db.models.functions import Concat, Substr
+from django.utils import timezone
 from django.utils.text import slugify
 from shops.models import Shop
 
+PATH_SEPARATOR = '/'
+
 class Category(models.Model):
     name = models.CharField(max_length=100)
     slug = models.SlugField(max_length=100, unique=True)
@@ -10,6 +15,10 @@ class Category(models.Model):
     parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='children')
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    
+    # Materialized path of ancestor ids, e.g. "3/17/42/"; kept in sync by save()
+    path = models.CharField(max_length=255, blank=True, default='', editable=False, db_index=True)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
 
     class Meta:
         verbose_name_plural = 'Categories'
@@ -18,10 +27,61 @@ class Category(models.Model):
     def __str__(self):
         return self.name
     
+    def _creates_cycle(self):
+        return bool(self.path and self.parent_id and self.parent.path.startswith(self.path))
+    
+    def clean(self):
+        if self._creates_cycle():
+            raise ValidationError({'parent': 'A category cannot be moved under itself or its own subcategory.'})
+    
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
+        if self._creates_cycle():
+            raise ValueError('A category cannot be moved under itself or its own subcategory.')
         super().save(*args, **kwargs)
+        self._sync_path()
+    
+    def _sync_path(self):
+        """Recompute this node's path and rewrite its subtree if it moved"""
+        parent_path = self.parent.path if self.parent_id else ''
+        new_path = f"{parent_path}{self.pk}{PATH_SEPARATOR}"
+        old_path = self.path
+        if new_path == old_path:
+            return
+        
+        new_depth = new_path.count(PATH_SEPARATOR) - 1
+        Category.objects.filter(pk=self.pk).update(path=new_path, depth=new_depth)
+        if old_path:
+            Category.objects.filter(subtree_q(old_path)).exclude(pk=self.pk).update(
+                path=Concat(models.Value(new_path), Substr('path', len(old_path) + 1)),
+                depth=models.F('depth') + (new_depth - self.depth),
+            )
+        self.path = new_path
+        self.depth = new_depth
+    
+    def subtree_q(self, field='path'):
+        """Q matching this category and every descendant on ``field``"""
+        return subtree_q(self.path, field)
+    
+    def get_descendants(self, include_self=True):
+        categories = Category.objects.filter(self.subtree_q())
+        if not include_self:
+            categories = categories.exclude(pk=self.pk)
+        return categories
+
+
+def subtree_q(path, field='path'):
+    """
+    Prefix condition for every path starting with ``path``.
+    
+    A prefix match does not depend on the column's collation (a range such
+    as "3/17/" <= path < "3/170" only holds under byte-order collation, not
+    e.g. Postgres' en_US.UTF-8). On Postgres the ``varchar_pattern_ops``
+    index Django adds for the indexed ``path`` column serves it.
+    """
+    return models.Q(**{f'{field}__startswith': path})
+
 
 class Product(models.Model):
     shop = models.ForeignKey(Shop, on_delete=models.CASCADE, related_name='products')
@@ -31,6 +91,8 @@ class Product(models.Model):
     description = models.TextField(blank=True, null=True)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     stock = models.PositiveIntegerField(default=0)
+    # Units held for orders awaiting online payment (orders.StockHold)
+    reserved = models.PositiveIntegerField(default=0, editable=False)
     image = models.ImageField(upload_to='products/', blank=True, null=True)
     is_active = models.BooleanField(default=True)
     is_featured = models.BooleanField(default=False)
@@ -39,18 +101,72 @@ class Product(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Keyset pagination (store.pagination) for each listing sort
+            models.Index(fields=['is_active', '-created_at', '-id'], name='store_prod_active_new_idx'),
+            models.Index(fields=['is_active', 'price', 'id'], name='store_prod_active_price_idx'),
+            models.Index(fields=['category', 'is_active', '-created_at', '-id'], name='store_prod_cat_new_idx'),
+        ]
 
     def __str__(self):
         return self.name
-    
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Saved stock edits are applied and logged relative to this (store.inventory.record_edit)
+        instance._loaded_stock = instance.__dict__.get('stock')
+        return instance
+
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
-        super().save(*args, **kwargs)
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            # reserved only moves through F() updates (orders.holds); writing
+            # back the copy loaded with this instance would undo newer holds
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'reserved' and field.attname not in deferred
+            ]
+        update_fields = kwargs.get('update_fields')
+        loaded_stock = getattr(self, '_loaded_stock', None)
+        if update_fields is None or 'stock' not in update_fields or loaded_stock is None:
+            super().save(*args, **kwargs)
+        elif self.stock == loaded_stock:
+            # Untouched: sales may have moved the row since it was loaded
+            kwargs['update_fields'] = [name for name in update_fields if name != 'stock']
+            super().save(*args, **kwargs)
+        else:
+            with transaction.atomic():
+                self._rebase_stock_edit(loaded_stock)
+                super().save(*args, **kwargs)
+
+    def _rebase_stock_edit(self, loaded_stock):
+        """Apply the edit from ``loaded_stock`` to the stock now in the row, instead of overwriting it"""
+        current = Product.objects.select_for_update().values_list('stock', flat=True).get(pk=self.pk)
+        self.stock = max(current + self.stock - loaded_stock, 0)
+        # store.inventory.record_edit logs the change from here
+        self._loaded_stock = current
+
+    @property
+    def available(self):
+        """Units that can still be sold: stock not held for pending payments"""
+        return max(self.stock - self.reserved, 0)
     
     @property
     def in_stock(self):
-        return self.stock > 0
+        return self.available > 0
+    
+    @property
+    def current_price(self):
+        """Price after promotions, once ``promotions.pricing.apply_prices`` has run"""
+        sale_price = getattr(self, 'sale_price', None)
+        return self.price if sale_price is None else sale_price
+    
+    @property
+    def on_sale(self):
+        return self.current_price < self.price
 
 class ProductImage(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='images')
@@ -64,3 +180,121 @@ class ProductImage(models.Model):
 
     def __str__(self):
         return f"Image for {self.product.name}"
+
+
+class RelatedProducts(models.Model):
+    """Top co-purchased neighbours of one product, rebuilt offline by ``build_related_products``"""
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='related')
+    # Neighbour product ids, best match first
+    product_ids = models.JSONField(default=list)
+    built_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'Related products'
+
+    def __str__(self):
+        return f"Related to product {self.product_id}"
+
+
+class ProductCard(models.Model):
+    """
+    Denormalized listing row for one active product, maintained by ``store.cards``.
+    
+    ``id`` is the product id. Listings read this table alone instead of
+    joining products to shops, categories, images and promotions.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    shop = models.ForeignKey(Shop, on_delete=models.CASCADE, related_name='+')
+    shop_name = models.CharField(max_length=200)
+    shop_slug = models.SlugField(max_length=200)
+    category_id = models.BigIntegerField(null=True, blank=True)
+    name = models.CharField(max_length=200)
+    slug = models.SlugField(max_length=200)
+    summary = models.CharField(max_length=255, blank=True)
+    image = models.ImageField(max_length=255, blank=True)
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    # Best running promotion; trust it only until priced_until
+    sale_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    sale_event_id = models.BigIntegerField(null=True, blank=True)
+    priced_until = models.DateTimeField(null=True, blank=True, db_index=True)
+    in_stock = models.BooleanField(default=False)
+    is_featured = models.BooleanField(default=False)
+    created_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-created_at', '-id']
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='store_card_new_idx'),
+            models.Index(fields=['price', 'id'], name='store_card_price_idx'),
+            models.Index(fields=['category_id', '-created_at', '-id'], name='store_card_cat_idx'),
+            models.Index(fields=['shop', '-created_at', '-id'], name='store_card_shop_idx'),
+            models.Index(fields=['is_featured', '-created_at', '-id'], name='store_card_featured_idx'),
+        ]
+
+    def __str__(self):
+        return self.name
+    
+    @property
+    def current_price(self):
+        if self.sale_price is not None and (self.priced_until is None or self.priced_until > timezone.now()):
+            return self.sale_price
+        return self.price
+    
+    @property
+    def on_sale(self):
+        return self.current_price < self.price
+
+
+class CartLine(models.Model):
+    """
+    One product in a cart, the durable copy behind ``store.cart``.
+    
+    ``cart_key`` is ``user:<id>`` for signed-in shoppers and ``anon:<token>``
+    for anonymous ones; reads are served from the cart cache.
+    """
+    cart_key = models.CharField(max_length=64)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    qty = models.PositiveIntegerField()
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['cart_key', 'product'], name='store_cartline_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.cart_key}: {self.qty} x product {self.product_id}"
+
+
+class StockMovement(models.Model):
+    """
+    One change to a product's stock, appended by ``store.inventory``.
+    
+    The quantities of a product's movements add up to ``Product.stock``;
+    compaction folds old rows into one ``snapshot`` row per product.
+    """
+    REASON_CHOICES = [
+        ('sale', 'Sale'),
+        ('cancel', 'Order cancelled'),
+        ('refund', 'Refund'),
+        ('adjust', 'Manual adjustment'),
+        ('import', 'Import'),
+        ('snapshot', 'Balance brought forward'),
+    ]
+    
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_movements')
+    quantity = models.IntegerField(help_text="Positive adds stock, negative removes it")
+    reason = models.CharField(max_length=20, choices=REASON_CHOICES)
+    order = models.ForeignKey('orders.Order', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    note = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        ordering = ['-created_at', '-id']
+        indexes = [
+            models.Index(fields=['product', 'created_at'], name='store_stockmove_product_idx'),
+            models.Index(fields=['created_at'], name='store_stockmove_created_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.quantity:+d} {self.get_reason_display()} for product {self.product_id}"
@@ -0,0 +1,184 @@
+"""
+Keyset (cursor) pagination for catalog listings.
+
+Offset pagination makes the database walk and discard every row before the
+requested page. Here each page instead starts strictly after the last row
+of the previous one, using the active sort column plus ``id`` as a
+tie-breaker, so a page costs the same no matter how deep the user scrolls.
+
+Cursors are opaque URL-safe strings; a cursor minted for one ordering is
+ignored when the ordering changes.
+"""
+import base64
+import binascii
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+
+DEFAULT_PER_PAGE = 24
+MAX_PER_PAGE = 100
+
+# Supported orderings -> full ORDER BY with a unique tie-breaker.
+ORDERINGS = {
+    "-created_at": ("-created_at", "-id"),
+    "price": ("price", "id"),
+    "-price": ("-price", "-id"),
+    "-id": ("-id",),
+    "-search_rank": ("-search_rank", "-id"),
+}
+
+
+def _encode_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def _decode_value(queryset, field_name, raw):
+    try:
+        field = queryset.model._meta.get_field(field_name)
+    except FieldDoesNotExist:
+        field = queryset.query.annotations[field_name].output_field
+    return field.to_python(raw)
+
+
+def _row_value(row, field_name):
+    if isinstance(row, dict):
+        return row[field_name]
+    return getattr(row, field_name)
+
+
+class CursorPage:
+    """One page of results plus the cursor that fetches the next one."""
+
+    def __init__(self, object_list, next_cursor, cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.cursor = cursor
+        self.next_url = None
+        self.first_url = None
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def is_first(self):
+        return self.cursor is None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    def as_dict(self, serialize=None):
+        """JSON-ready payload; ``serialize`` maps each row to a dict."""
+        rows = self.object_list if serialize is None else [serialize(obj) for obj in self.object_list]
+        return {
+            "results": rows,
+            "next_cursor": self.next_cursor,
+            "has_next": self.has_next,
+        }
+
+
+class CursorPaginator:
+    """
+    Paginate ``queryset`` with keyset conditions on ``ordering``.
+
+    ``ordering`` must be one of ``ORDERINGS``. Works with model and
+    ``.values()`` querysets alike, provided the ordered fields are selected.
+    """
+
+    def __init__(self, queryset, ordering="-created_at", per_page=DEFAULT_PER_PAGE,
+                 max_per_page=MAX_PER_PAGE):
+        if ordering not in ORDERINGS:
+            raise ValueError(f"Unsupported ordering {ordering!r}")
+        self.queryset = queryset
+        self.ordering = ordering
+        self.order_by = ORDERINGS[ordering]
+        self.per_page = max(1, min(int(per_page), max_per_page))
+
+    def encode_cursor(self, row):
+        values = [_encode_value(_row_value(row, key.lstrip("-"))) for key in self.order_by]
+        payload = json.dumps({"o": self.ordering, "k": values}, separators=(",", ":"))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+    def decode_cursor(self, cursor):
+        """Return the key values encoded in ``cursor``, or ``None`` if unusable."""
+        if not cursor:
+            return None
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            if payload.get("o") != self.ordering or len(payload["k"]) != len(self.order_by):
+                return None
+            return [
+                _decode_value(self.queryset, key.lstrip("-"), raw)
+                for key, raw in zip(self.order_by, payload["k"])
+            ]
+        except (ValueError, KeyError, TypeError, AttributeError, binascii.Error, ValidationError):
+            return None
+
+    def _after(self, values):
+        """Build ``(a, b, c) > (x, y, z)`` as nested OR/AND for portability."""
+        condition = Q()
+        for index in range(len(self.order_by) - 1, -1, -1):
+            key = self.order_by[index]
+            name = key.lstrip("-")
+            lookup = "lt" if key.startswith("-") else "gt"
+            step = Q(**{f"{name}__{lookup}": values[index]})
+            if index < len(self.order_by) - 1:
+                step |= Q(**{name: values[index]}) & condition
+            condition = step
+        return condition
+
+    def window(self, cursor=None):
+        """
+        Return ``(queryset, cursor)`` for the page after ``cursor``.
+
+        The queryset is sliced to one row more than ``per_page``; that extra
+        row only signals that another page exists. ``cursor`` comes back as
+        ``None`` when it could not be used.
+        """
+        values = self.decode_cursor(cursor)
+        queryset = self.queryset.order_by(*self.order_by)
+        if values is not None:
+            queryset = queryset.filter(self._after(values))
+        else:
+            cursor = None
+        return queryset[: self.per_page + 1], cursor
+
+    def page(self, cursor=None):
+        queryset, cursor = self.window(cursor)
+        rows = list(queryset)
+        next_cursor = None
+        if len(rows) > self.per_page:
+            rows = rows[: self.per_page]
+            next_cursor = self.encode_cursor(rows[-1])
+        return CursorPage(rows, next_cursor, cursor)
+
+
+def paginate(request, queryset, ordering="-created_at", per_page=DEFAULT_PER_PAGE):
+    """Page ``queryset`` from ``?cursor=`` and attach a ``next_url`` for templates."""
+    page = CursorPaginator(queryset, ordering, per_page).page(request.GET.get("cursor"))
+    params = request.GET.copy()
+    params.pop("cursor", None)
+    if not page.is_first:
+        page.first_url = f"?{params.urlencode()}"
+    if page.has_next:
+        params["cursor"] = page.next_cursor
+        page.next_url = f"?{params.urlencode()}"
+    return page
+
+
+def wants_json(request):
+    return request.GET.get("format") == "json" or "application/json" in request.headers.get("Accept", "")
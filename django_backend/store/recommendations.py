@@ -0,0 +1,123 @@
+"""
+Offline "bought together" recommendations.
+
+``build_related_products`` walks ``orders.OrderItem`` once, ordered by order,
+and counts how often each pair of products shares a basket. Counts are kept
+in a sparse dict-of-Counters, so memory grows with the pairs that actually
+occur rather than with the square of the catalog. Pairs are scored by cosine
+similarity (co-purchases over the geometric mean of each product's order
+count) so best sellers don't crowd every list, and the top N ids per product
+are stored in ``RelatedProducts``.
+"""
+import heapq
+import math
+from collections import Counter, defaultdict
+
+from django.db import transaction
+
+from .models import Product, RelatedProducts
+
+DEFAULT_TOP_N = 12
+MIN_CO_PURCHASES = 1
+# Bulk orders pair everything with everything and say little about affinity.
+MAX_BASKET_SIZE = 50
+CHUNK_SIZE = 2000
+
+
+def _baskets():
+    """Yield the set of product ids in each non-cancelled order."""
+    from orders.models import OrderItem
+
+    rows = (
+        OrderItem.objects.filter(product__isnull=False)
+        .exclude(order__status='cancelled')
+        .order_by('order_id')
+        .values_list('order_id', 'product_id')
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+    current, basket = None, set()
+    for order_id, product_id in rows:
+        if order_id != current:
+            if basket:
+                yield basket
+            current, basket = order_id, set()
+        basket.add(product_id)
+    if basket:
+        yield basket
+
+
+def count_co_purchases(baskets):
+    """Return ``(pair counts, order counts)`` for an iterable of id sets."""
+    pairs = defaultdict(Counter)
+    orders = Counter()
+    for basket in baskets:
+        if len(basket) > MAX_BASKET_SIZE:
+            continue
+        orders.update(basket)
+        for product_id in basket:
+            for other_id in basket:
+                if other_id != product_id:
+                    pairs[product_id][other_id] += 1
+    return pairs, orders
+
+
+def top_neighbours(pairs, orders, top_n=DEFAULT_TOP_N, min_count=MIN_CO_PURCHASES):
+    """Map each product id to its best ``top_n`` neighbour ids."""
+    neighbours = {}
+    for product_id, counts in pairs.items():
+        scored = (
+            (count / math.sqrt(orders[product_id] * orders[other_id]), count, -other_id)
+            for other_id, count in counts.items()
+            if count >= min_count
+        )
+        best = heapq.nlargest(top_n, scored)
+        if best:
+            neighbours[product_id] = [-other_id for _, _, other_id in best]
+    return neighbours
+
+
+def build_related_products(top_n=DEFAULT_TOP_N, min_count=MIN_CO_PURCHASES):
+    """Recompute every product's neighbours and replace the stored table."""
+    pairs, orders = count_co_purchases(_baskets())
+    neighbours = top_neighbours(pairs, orders, top_n, min_count)
+    existing = set(Product.objects.filter(pk__in=neighbours.keys()).values_list('pk', flat=True))
+    rows = [
+        RelatedProducts(product_id=product_id, product_ids=ids)
+        for product_id, ids in neighbours.items()
+        if product_id in existing
+    ]
+    with transaction.atomic():
+        RelatedProducts.objects.exclude(product_id__in=existing).delete()
+        RelatedProducts.objects.bulk_create(
+            rows,
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=['product'],
+            update_fields=['product_ids', 'built_at'],
+        )
+    return len(rows)
+
+
+def related_products(product, limit=4):
+    """
+    Active neighbours of ``product``, best first.
+
+    Falls back to the newest items in the same category when the product has
+    no co-purchase data yet.
+    """
+    ids = (
+        RelatedProducts.objects.filter(pk=product.pk).values_list('product_ids', flat=True).first()
+        or []
+    )
+    related = []
+    if ids:
+        by_id = Product.objects.filter(pk__in=ids, is_active=True).select_related('shop').in_bulk()
+        related = [by_id[pk] for pk in ids if pk in by_id][:limit]
+    if len(related) < limit and product.category_id:
+        related += list(
+            Product.objects.filter(category_id=product.category_id, is_active=True)
+            .exclude(pk__in=[product.pk, *ids])
+            .select_related('shop')
+            .order_by('-created_at', '-id')[: limit - len(related)]
+        )
+    return related
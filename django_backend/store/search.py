@@ -0,0 +1,216 @@
+"""
+Full-text product search.
+
+PostgreSQL keeps a weighted ``tsvector`` column on ``store_product`` behind a
+GIN index. SQLite (dev/test) keeps an FTS5 shadow table whose rowid is the
+product id. Both are created by migration ``store.0002`` and kept current by
+the ``Product`` save/delete handlers in ``store.signals``.
+"""
+import re
+
+from django.db import connection
+from django.db.models import BooleanField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = "store_product_fts"
+TSVECTOR_COLUMN = "search_vector"
+TSVECTOR_INDEX = "store_product_search_gin"
+SEARCH_CONFIG = "english"
+
+# Fields that feed the index; saves that touch none of them skip re-indexing.
+INDEXED_FIELDS = frozenset({"name", "description"})
+
+_TERM_RE = re.compile(r"\w+", re.UNICODE)
+_fts_available = {}
+
+
+def _product_table():
+    from .models import Product
+    return Product._meta.db_table
+
+
+def _terms(query):
+    return _TERM_RE.findall(query or "")[:16]
+
+
+def backend(using=None):
+    """Return ``'postgresql'``, ``'sqlite'`` or ``None`` (plain ``icontains``)."""
+    conn = connection if using is None else using
+    if conn.vendor == "postgresql":
+        return "postgresql"
+    if conn.vendor == "sqlite":
+        key = conn.settings_dict["NAME"]
+        if key not in _fts_available:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s",
+                    [FTS_TABLE],
+                )
+                _fts_available[key] = cursor.fetchone() is not None
+        if _fts_available[key]:
+            return "sqlite"
+    return None
+
+
+# -------------------- Schema --------------------
+
+def create_index(schema_editor):
+    """Create the vendor-specific index structures and backfill them."""
+    conn = schema_editor.connection
+    table = conn.ops.quote_name(_product_table())
+    if conn.vendor == "postgresql":
+        schema_editor.execute(f"ALTER TABLE {table} ADD COLUMN {TSVECTOR_COLUMN} tsvector")
+        schema_editor.execute(f"UPDATE {table} SET {TSVECTOR_COLUMN} = {_pg_vector_sql()}")
+        schema_editor.execute(
+            f"CREATE INDEX {TSVECTOR_INDEX} ON {table} USING GIN ({TSVECTOR_COLUMN})"
+        )
+    elif conn.vendor == "sqlite":
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+            "name, description, tokenize = 'porter unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, name, description) "
+            f"SELECT id, name, COALESCE(description, '') FROM {table}"
+        )
+    _fts_available.clear()
+
+
+def drop_index(schema_editor):
+    conn = schema_editor.connection
+    if conn.vendor == "postgresql":
+        table = conn.ops.quote_name(_product_table())
+        schema_editor.execute(f"DROP INDEX IF EXISTS {TSVECTOR_INDEX}")
+        schema_editor.execute(f"ALTER TABLE {table} DROP COLUMN IF EXISTS {TSVECTOR_COLUMN}")
+    elif conn.vendor == "sqlite":
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+    _fts_available.clear()
+
+
+def _pg_vector_sql():
+    return (
+        f"setweight(to_tsvector('{SEARCH_CONFIG}', COALESCE(name, '')), 'A') || "
+        f"setweight(to_tsvector('{SEARCH_CONFIG}', COALESCE(description, '')), 'B')"
+    )
+
+
+# -------------------- Index maintenance --------------------
+
+def index_product(product):
+    """Write one product's current name/description into the index."""
+    engine = backend()
+    if engine is None:
+        return
+    table = connection.ops.quote_name(_product_table())
+    with connection.cursor() as cursor:
+        if engine == "postgresql":
+            cursor.execute(
+                f"UPDATE {table} SET {TSVECTOR_COLUMN} = {_pg_vector_sql()} WHERE id = %s",
+                [product.pk],
+            )
+        else:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [product.pk])
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, name, description) VALUES (%s, %s, %s)",
+                [product.pk, product.name, product.description or ""],
+            )
+
+
+def remove_product(product_id):
+    """Drop a deleted product from the shadow table (Postgres needs nothing)."""
+    if backend() == "sqlite":
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [product_id])
+
+
+def rebuild_index():
+    """Re-index every product, e.g. after a bulk ``update()`` or raw import."""
+    engine = backend()
+    table = connection.ops.quote_name(_product_table())
+    with connection.cursor() as cursor:
+        if engine == "postgresql":
+            cursor.execute(f"UPDATE {table} SET {TSVECTOR_COLUMN} = {_pg_vector_sql()}")
+        elif engine == "sqlite":
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, name, description) "
+                f"SELECT id, name, COALESCE(description, '') FROM {table}"
+            )
+    return engine
+
+
+# -------------------- Querying --------------------
+
+def search_products(queryset, query):
+    """
+    Filter a ``Product`` queryset down to matches for ``query``.
+
+    Every term is prefix-matched and all terms must match. Results are
+    annotated with ``search_rank`` (higher is better) but left unordered so
+    callers can combine them with their own sort.
+
+    ``queryset`` may also be of a model keyed by product id (``ProductCard``);
+    the index is then joined on ``id`` and ``icontains`` runs on its ``name``.
+    """
+    terms = _terms(query)
+    if not terms:
+        return queryset.annotate(search_rank=Value(0.0, output_field=FloatField())).none()
+
+    engine = backend()
+    products = connection.ops.quote_name(_product_table())
+    table = connection.ops.quote_name(queryset.model._meta.db_table)
+
+    if engine == "postgresql":
+        # ts_rank_cd returns float4; as float8 the rank survives the round
+        # trip through a pagination cursor (a Python float) exactly
+        tsquery = " & ".join(f"{term}:*" for term in terms)
+        if table != products:
+            return queryset.filter(
+                id__in=RawSQL(
+                    f"SELECT id FROM {products} WHERE {TSVECTOR_COLUMN} @@ to_tsquery(%s, %s)",
+                    [SEARCH_CONFIG, tsquery],
+                )
+            ).annotate(
+                search_rank=RawSQL(
+                    f"SELECT ts_rank_cd(p.{TSVECTOR_COLUMN}, to_tsquery(%s, %s))::float8 "
+                    f"FROM {products} p WHERE p.id = {table}.id",
+                    [SEARCH_CONFIG, tsquery],
+                    output_field=FloatField(),
+                )
+            )
+        return queryset.alias(
+            _search_match=RawSQL(
+                f"{table}.{TSVECTOR_COLUMN} @@ to_tsquery(%s, %s)",
+                [SEARCH_CONFIG, tsquery],
+                output_field=BooleanField(),
+            )
+        ).filter(_search_match=True).annotate(
+            search_rank=RawSQL(
+                f"ts_rank_cd({table}.{TSVECTOR_COLUMN}, to_tsquery(%s, %s))::float8",
+                [SEARCH_CONFIG, tsquery],
+                output_field=FloatField(),
+            )
+        )
+
+    if engine == "sqlite":
+        match = " ".join('"{}"*'.format(term.replace('"', "")) for term in terms)
+        # bm25() is lower-is-better; negate so both backends rank descending.
+        return queryset.filter(
+            id__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match])
+        ).annotate(
+            search_rank=RawSQL(
+                f"SELECT -bm25({FTS_TABLE}) FROM {FTS_TABLE} "
+                f"WHERE {FTS_TABLE} MATCH %s AND rowid = {table}.id",
+                [match],
+                output_field=FloatField(),
+            )
+        )
+
+    text_fields = ("name", "description") if table == products else ("name", "summary")
+    condition = Q()
+    for term in terms:
+        term_q = Q()
+        for field in text_fields:
+            term_q |= Q(**{f"{field}__icontains": term})
+        condition &= term_q
+    return queryset.filter(condition).annotate(search_rank=Value(0.0, output_field=FloatField()))
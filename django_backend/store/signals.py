@@ -0,0 +1,106 @@
+from django.contrib.auth.signals import user_logged_in
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from shops.models import Shop
+from .models import Product, ProductCard, Category, ProductImage
+from . import cards, cart, images, inventory, search
+from .cache import bump_catalog_version
+from .categories import bump_tree_version
+
+
+@receiver(post_save, sender=Product)
+def update_product_search_index(sender, instance, update_fields=None, **kwargs):
+    """Keep the full-text index in step with product name/description"""
+    if update_fields is not None and not search.INDEXED_FIELDS.intersection(update_fields):
+        return
+    search.index_product(instance)
+
+
+@receiver(post_save, sender=Product)
+def record_stock_edit(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    """Log stock set by saving a product (seller form, admin) in the movement ledger"""
+    if raw or (update_fields is not None and 'stock' not in update_fields):
+        return
+    inventory.record_edit(instance, created)
+
+
+@receiver(post_delete, sender=Product)
+def remove_product_search_index(sender, instance, **kwargs):
+    """Drop deleted products from the full-text index"""
+    search.remove_product(instance.pk)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_tree(sender, **kwargs):
+    """Make every process rebuild its cached navigation tree"""
+    bump_tree_version()
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_save, sender=Shop)
+@receiver(post_delete, sender=Shop)
+def invalidate_catalog_fragments(sender, **kwargs):
+    """Retire every cached catalog fragment"""
+    bump_catalog_version()
+
+
+IMAGE_FIELDS = {
+    Product: ('image',),
+    ProductImage: ('image',),
+    Category: ('image',),
+    Shop: ('logo', 'banner'),
+}
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Shop)
+def generate_image_derivatives(sender, instance, update_fields=None, **kwargs):
+    """Queue resized copies of new uploads"""
+    images.schedule_fields(instance, IMAGE_FIELDS[sender], update_fields)
+
+
+@receiver(post_save, sender=Product)
+def refresh_product_card(sender, instance, **kwargs):
+    """Keep the listing card in step with the product"""
+    cards.refresh_card(instance)
+
+
+@receiver(post_delete, sender=Product)
+def delete_product_card(sender, instance, **kwargs):
+    ProductCard.objects.filter(pk=instance.pk).delete()
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def refresh_card_image(sender, instance, **kwargs):
+    """The gallery may supply the card's thumbnail"""
+    cards.refresh_cards([instance.product_id])
+
+
+@receiver(post_save, sender=Shop)
+def refresh_shop_cards(sender, instance, **kwargs):
+    cards.refresh_shop_cards(instance)
+
+
+@receiver(post_delete, sender=Category)
+def detach_category_cards(sender, instance, **kwargs):
+    cards.detach_category_cards(instance.pk)
+
+
+@receiver(user_logged_in)
+def merge_anonymous_cart(sender, request, user, **kwargs):
+    """Carry what was added before signing in over to the user's cart"""
+    if request is None:
+        return
+    anonymous_key = cart.session_cart_key(request.session)
+    if anonymous_key is not None:
+        cart.merge_carts(anonymous_key, cart.user_cart_key(user))
+        del request.session[cart.TOKEN_SESSION_KEY]
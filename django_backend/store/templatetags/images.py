@@ -0,0 +1,43 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+
+from store.images import DEFAULT_WIDTH, derivatives
+
+register = template.Library()
+
+
+@register.filter
+def srcset(fieldfile, fmt="webp"):
+    """``srcset`` value listing the derivatives of an image, e.g. "a.png.w240.webp 240w, ..." """
+    return _srcset(derivatives(fieldfile).get(fmt, []))
+
+
+def _srcset(found):
+    return ", ".join(f"{url} {width}w" for width, url in found)
+
+
+@register.simple_tag
+def responsive_img(fieldfile, alt="", sizes="100vw", **attrs):
+    """
+    ``<picture>`` with WebP and JPEG ``srcset``s for an uploaded image.
+
+    Falls back to a plain ``<img>`` of the original until the derivatives
+    have been generated. Extra keyword arguments become ``<img>`` attributes.
+    """
+    if not fieldfile:
+        return ""
+    extra = format_html_join("", ' {}="{}"', ((key.replace("_", "-"), value) for key, value in attrs.items()))
+    found = derivatives(fieldfile)
+    jpegs = found.get("jpg")
+    if not jpegs:
+        return format_html('<img src="{}" alt="{}" loading="lazy"{}>', fieldfile.url, alt, extra)
+
+    fallback = next((url for width, url in jpegs if width >= DEFAULT_WIDTH), jpegs[-1][1])
+    return format_html(
+        '<picture class="d-block">'
+        '<source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" alt="{}" loading="lazy"{}>'
+        '</picture>',
+        _srcset(found.get("webp", [])), sizes,
+        fallback, _srcset(jpegs), sizes, alt, extra,
+    )
@@ -1,51 +1,81 @@
 from django.http import JsonResponse
 from django.shortcuts import render, get_object_or_404, redirect
-from django.db.models import Q
 from django.contrib import messages
-from .models import Product, Category
+from django.utils.cache import get_conditional_response
+from django.views.decorators.http import require_GET
+from .models import Product, ProductCard, Category
+from .api import CatalogFeed
+from .cache import catalog_version, fragment_timeout
+from .cards import in_category, search_cards
+from .cart import Cart
+from .categories import get_active_categories, get_category_tree, get_category_node
+from .pagination import paginate, wants_json
+from .recommendations import related_products as related_products_for
+from promotions.pricing import apply_prices
 
 BRAND = "Karupatti Shop"
 
+SORT_ORDERINGS = {
+    'price_low': 'price',
+    'price_high': '-price',
+    'newest': '-created_at',
+}
+
+
+def _card_payload(card):
+    return {
+        "id": card.id,
+        "name": card.name,
+        "slug": card.slug,
+        "price": str(card.price),
+        "current_price": str(card.current_price),
+        "in_stock": card.in_stock,
+        "shop": card.shop_name,
+        "image": card.image.url if card.image else None,
+    }
+
+
 def home(request):
-    featured_products = Product.objects.filter(is_active=True, is_featured=True)[:6]
-    categories = Category.objects.filter(is_active=True, parent=None)[:6]
+    # Both sections are rendered inside {% cache %} blocks keyed on the
+    # catalog version, so the lazy queryset only runs on a cache miss.
+    featured_products = ProductCard.objects.filter(is_featured=True)[:6]
+    categories = get_category_tree()[:6]
     
     context = {
         "brand": BRAND,
         "featured_products": featured_products,
         "categories": categories,
+        "catalog_version": catalog_version(),
+        "fragment_timeout": fragment_timeout(),
     }
     return render(request, "home.html", context)
 
 def product_list(request):
-    products = Product.objects.filter(is_active=True)
-    categories = Category.objects.filter(is_active=True)
+    products = ProductCard.objects.all()
+    categories = get_active_categories()
     
     # Search functionality
     search_query = request.GET.get('search', '')
     if search_query:
-        products = products.filter(
-            Q(name__icontains=search_query) | 
-            Q(description__icontains=search_query)
-        )
+        products = search_cards(products, search_query)
     
     # Category filter
     category_slug = request.GET.get('category', '')
     if category_slug:
         category = get_object_or_404(Category, slug=category_slug)
-        products = products.filter(category=category)
+        products = in_category(products, category)
     
-    # Price sorting
+    # Price sorting; searches default to relevance
     sort_by = request.GET.get('sort', '')
-    if sort_by == 'price_low':
-        products = products.order_by('price')
-    elif sort_by == 'price_high':
-        products = products.order_by('-price')
-    elif sort_by == 'newest':
-        products = products.order_by('-created_at')
+    ordering = SORT_ORDERINGS.get(sort_by, '-search_rank' if search_query else '-created_at')
+    page = paginate(request, products, ordering)
+    
+    if wants_json(request):
+        return JsonResponse(page.as_dict(_card_payload))
     
     context = {
-        "products": products,
+        "products": page,
+        "page": page,
         "categories": categories,
         "search_query": search_query,
         "category_slug": category_slug,
@@ -55,10 +85,8 @@ def product_list(request):
 
 def product_detail(request, slug):
     product = get_object_or_404(Product, slug=slug, is_active=True)
-    related_products = Product.objects.filter(
-        category=product.category, 
-        is_active=True
-    ).exclude(id=product.id)[:4]
+    related_products = related_products_for(product, limit=4)
+    apply_prices([product, *related_products])
     
     context = {
         "product": product,
@@ -68,11 +96,19 @@ def product_detail(request, slug):
 
 def category_detail(request, slug):
     category = get_object_or_404(Category, slug=slug, is_active=True)
-    products = Product.objects.filter(category=category, is_active=True)
+    products = in_category(ProductCard.objects.all(), category)
+    page = paginate(request, products, '-created_at')
+    
+    if wants_json(request):
+        return JsonResponse(page.as_dict(_card_payload))
+    
+    node = get_category_node(category.pk)
     
     context = {
         "category": category,
-        "products": products,
+        "subcategories": node.tree_children if node else [],
+        "products": page,
+        "page": page,
     }
     return render(request, "products/category_detail.html", context)
 
@@ -82,38 +118,29 @@ def about(request):
 def contact(request):
     return render(request, "pages/contact.html")
 
+@require_GET
 def products_api(request):
-    items = [
-        {"id": 1, "name": "Karupatti (Palm Jaggery) 500g", "price": 6.50},
-        {"id": 2, "name": "Karupatti Candy 250g", "price": 3.80},
-        {"id": 3, "name": "Karupatti Syrup 300ml", "price": 5.20},
-    ]
-    return JsonResponse({"brand": BRAND, "products": items})
+    """Streaming catalog feed, see ``store.api``"""
+    try:
+        feed = CatalogFeed.from_request(request)
+    except ValueError as exc:
+        return JsonResponse({"error": str(exc)}, status=400)
+    
+    etag, last_modified = feed.validators()
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return feed.set_validators(not_modified)
+    return feed.response(request)
 
 def cart(request):
     """Display the shopping cart"""
-    cart_data = request.session.get('cart', {})
-    items = []
-    subtotal = 0
-    
-    for product_id, qty in cart_data.items():
-        try:
-            product = Product.objects.get(id=product_id, is_active=True)
-            line_total = product.price * qty
-            subtotal += line_total
-            items.append({
-                'product': product,
-                'qty': qty,
-                'line_total': line_total
-            })
-        except Product.DoesNotExist:
-            continue
-    
+    cart = Cart(request)
+    subtotal = cart.subtotal
     discount = request.session.get('cart_discount', 0)
     total = subtotal - discount
     
     context = {
-        'items': items,
+        'items': cart.lines,
         'subtotal': subtotal,
         'discount': discount,
         'total': total,
@@ -126,15 +153,7 @@ def cart_add(request, product_id):
     
     if request.method == 'POST':
         qty = int(request.POST.get('qty', 1))
-        cart_data = request.session.get('cart', {})
-        
-        if str(product_id) in cart_data:
-            cart_data[str(product_id)] += qty
-        else:
-            cart_data[str(product_id)] = qty
-        
-        request.session['cart'] = cart_data
-        request.session.modified = True
+        Cart(request).add(product.pk, qty)
         messages.success(request, f'{product.name} added to cart!')
     
     return redirect('store:cart')
@@ -143,26 +162,16 @@ def cart_update(request, product_id):
     """Update product quantity in cart"""
     if request.method == 'POST':
         qty = int(request.POST.get('qty', 1))
-        cart_data = request.session.get('cart', {})
-        
-        if qty > 0:
-            cart_data[str(product_id)] = qty
-        else:
-            cart_data.pop(str(product_id), None)
-        
-        request.session['cart'] = cart_data
-        request.session.modified = True
-        messages.success(request, 'Cart updated!')
+        cart = Cart(request)
+        if str(product_id) in cart.quantities:
+            cart.set(product_id, qty)
+            messages.success(request, 'Cart updated!')
     
     return redirect('store:cart')
 
 def cart_remove(request, product_id):
     """Remove a product from the cart"""
-    cart_data = request.session.get('cart', {})
-    cart_data.pop(str(product_id), None)
-    
-    request.session['cart'] = cart_data
-    request.session.modified = True
+    Cart(request).remove(product_id)
     messages.success(request, 'Item removed from cart!')
     
     return redirect('store:cart')
@@ -3,14 +3,18 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.http import JsonResponse
 from .models import Wishlist, WishlistItem
-from store.models import Product
+from store.models import Product, ProductCard
 
 
 @login_required
 def wishlist_view(request):
     """Display user's wishlist"""
     wishlist, created = Wishlist.objects.get_or_create(user=request.user)
-    items = wishlist.items.select_related('product', 'product__shop', 'product__category')
+    items = list(wishlist.items.all())
+    # Listing fields come from the card table; inactive products have no card
+    cards = ProductCard.objects.in_bulk([item.product_id for item in items])
+    for item in items:
+        item.card = cards.get(item.product_id)
     
     context = {
         'wishlist': wishlist,